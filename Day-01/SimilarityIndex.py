@@ -0,0 +1,58 @@
+from typing import Iterable
+
+class SimilarityIndex:
+    def __init__(self, list_a: Iterable[int] = (), list_b: Iterable[int] = ()):
+        # Histograms of both columns. The left one is needed as well, as adding a value to the right column
+        # increases the score by the value times its number of occurrences on the left
+        self.count_in_a: dict[int, int] = {}
+        self.count_in_b: dict[int, int] = {}
+        self.score = 0
+
+        self.extend_left(list_a)
+        self.extend_right(list_b)
+
+    def add_left(self, value: int):
+        self.count_in_a[value] = self.count_in_a.get(value, 0) + 1
+        self.score += value * self.count_in_b.get(value, 0)
+
+    def add_right(self, value: int):
+        self.count_in_b[value] = self.count_in_b.get(value, 0) + 1
+        self.score += value * self.count_in_a.get(value, 0)
+
+    def remove(self, value: int, right: bool = False):
+        # Remove one occurrence of value from the left column, or the right column if right is set
+        counts, other = (self.count_in_b, self.count_in_a) if right else (self.count_in_a, self.count_in_b)
+        current_count = counts.get(value, 0)
+        if current_count == 0:
+            raise KeyError(value)
+
+        if current_count == 1:
+            del counts[value]
+        else:
+            counts[value] = current_count - 1
+        self.score -= value * other.get(value, 0)
+
+    def extend_left(self, values: Iterable[int]):
+        for value in values:
+            self.add_left(value)
+
+    def extend_right(self, values: Iterable[int]):
+        for value in values:
+            self.add_right(value)
+
+    def merge(self, other: "SimilarityIndex") -> "SimilarityIndex":
+        # The combined score is the sum of both scores plus the cross terms between the left column of one
+        # index and the right column of the other. Only the values of the other index need to be visited
+        score = self.score + other.score
+        for value, count in other.count_in_a.items():
+            score += value * count * self.count_in_b.get(value, 0)
+        for value, count in other.count_in_b.items():
+            score += value * count * self.count_in_a.get(value, 0)
+
+        for value, count in other.count_in_a.items():
+            self.count_in_a[value] = self.count_in_a.get(value, 0) + count
+        for value, count in other.count_in_b.items():
+            self.count_in_b[value] = self.count_in_b.get(value, 0) + count
+
+        self.score = score
+        return self
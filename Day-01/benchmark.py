@@ -0,0 +1,56 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from main import merged_distance, merged_similarity, summarize_shards
+
+def generate_input(path: str, lines: int, seed: int = 1, block: int = 100_000):
+    # Same format as the real input: two columns of five digit ids separated by three spaces
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        for start in range(0, lines, block):
+            count = min(block, lines - start)
+            f.write("".join(f"{rng.randint(10000, 99999)}   {rng.randint(10000, 99999)}\n" for _ in range(count)))
+
+def run_benchmark(path: str, max_workers: int):
+    # Only parsing the shards runs in parallel. Merging their sorted runs and histograms happens in this process,
+    # so that step is serial and does not get faster with more workers
+    print(f"{'workers':>8} {'shards':>10} {'merge':>10} {'speedup':>8}")
+    baseline = None
+    workers = 1
+    while workers <= max_workers:
+        start = time.perf_counter()
+        summaries = summarize_shards(path, workers)
+        shard_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        distance = merged_distance(summaries)
+        similarity = merged_similarity(summaries)
+        merge_time = time.perf_counter() - start
+
+        total = shard_time + merge_time
+        baseline = baseline or total
+        print(f"{workers:>8} {shard_time:>9.2f}s {merge_time:>9.2f}s {baseline / total:>7.2f}x"
+              f"   ({distance}, {similarity})")
+
+        # Double the workers each round, but always include max_workers itself
+        workers = max_workers if workers < max_workers < workers * 2 else workers * 2
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scaling benchmark for the sharded Day 1 solvers")
+    parser.add_argument("-n", "--lines", type=int, default=100_000_000, help="lines of the synthetic input")
+    parser.add_argument("-w", "--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("-s", "--seed", type=int, default=1)
+    parser.add_argument("--input", help="use an existing input file instead of generating one")
+    args = parser.parse_args()
+
+    if args.input:
+        run_benchmark(args.input, args.max_workers)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, "input.txt")
+            print(f"Generating {args.lines} lines...")
+            generate_input(input_path, args.lines, args.seed)
+            run_benchmark(input_path, args.max_workers)
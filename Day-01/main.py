@@ -1,23 +1,182 @@
-def total_distance(list_a: list[int], list_b: list[int]) -> int:
+import argparse
+import heapq
+import os
+import sys
+import tempfile
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby, repeat
+from operator import sub
+from typing import Generator, Iterable, Iterator, Sequence
+
+# The shared helpers live in the aoc package at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aoc import cache, instrument
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is optional, without it the columns are plain array('q') buffers
+    np = None
+
+# A column can be a plain list, a compact array('q') or a NumPy int64 array
+Column = Sequence[int]
+ColumnPair = tuple[array, array]
+
+# Amount of bytes read from the input file per chunk. Without NumPy every value of a chunk briefly exists as a
+# bytes and an int object, so the chunks are kept smaller
+CHUNK_SIZE = 1 << 22 if np is not None else 1 << 20
+# Number of values read at once from each spilled run during the external merge
+RUN_BLOCK_SIZE = 1 << 16
+# Inputs that would need more memory than this are solved with the external merge sort instead of in memory
+MEMORY_LIMIT = 1 << 30
+# Peak memory of the in-memory solution per input line, and per byte of the chunk being parsed, as measured with
+# tracemalloc: both int64 columns, their sorted copies and the temporaries of comparing them. Without NumPy the
+# columns are sorted through lists of Python ints
+IN_MEMORY_BYTES_PER_LINE = 56 if np is not None else 80
+CHUNK_BYTES_FACTOR = 7 if np is not None else 12
+# Peak memory of the external sort per byte of input text in one run: the text, the parsed values of both
+# columns and their sorted copies
+RUN_BYTES_FACTOR = 7 if np is not None else 12
+
+def sorted_column(column: Column) -> Column:
+    # Return a sorted version of the column. Buffers are sorted by NumPy without ever creating Python ints,
+    # an array('q') comes back as a NumPy array sharing nothing with the original
+    if np is not None and isinstance(column, np.ndarray):
+        return np.sort(column)
+    if isinstance(column, array):
+        if np is not None:
+            return np.sort(np.frombuffer(column, dtype=np.dtype(column.typecode)))
+        # Without NumPy the only way to sort an array('q') is through a list
+        return array(column.typecode, sorted(column))
+    column.sort()
+    return column
+
+def total_distance(list_a: Column, list_b: Column) -> int:
     # Make sure the lists are sorted so that we can match the correct elements
-    list_a.sort()
-    list_b.sort()
+    # Plain lists are still sorted in place, buffers keep their type
+    sorted_a = sorted_column(list_a)
+    sorted_b = sorted_column(list_b)
 
-    # Create pairs to be able to calculate their relative distance
-    pairs = []
-    for i in range(len(list_a)):
-        pairs.append((list_a[i], list_b[i]))
+    if np is not None and isinstance(sorted_a, np.ndarray) and isinstance(sorted_b, np.ndarray):
+        return int(np.abs(sorted_a - sorted_b).sum())
 
-    print(pairs)
+    # Pair up the sorted elements on the fly, map() keeps the whole loop in C without building a list of pairs
+    return sum(map(abs, map(sub, sorted_a, sorted_b)))
 
-    # Calculate total distance based off the pairs
-    distance = 0
-    for (a, b) in pairs:
-        distance += abs(a - b)
+def spill_run(column: Column, directory: str, name: str) -> str:
+    # Write a sorted run as raw int64 values, which makes reading it back a plain memory copy
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        run = sorted_column(column)
+        if np is not None and isinstance(run, np.ndarray):
+            run.astype(np.int64).tofile(f)
+        else:
+            run.tofile(f)
+    return path
 
-    return distance
+def iter_run(path: str, block_size: int = RUN_BLOCK_SIZE) -> Iterator[int]:
+    # Stream a spilled run back in blocks so only block_size values per run are held in memory
+    with open(path, "rb") as f:
+        while True:
+            block = array('q')
+            try:
+                block.fromfile(f, block_size)
+            except EOFError:
+                # fromfile still keeps the values it could read before hitting the end of the file
+                yield from block
+                return
+            yield from block
+
+def count_lines(path: str, chunk_size: int = CHUNK_SIZE) -> int:
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    # The last line might not end with a line break
+    return lines + (last != b"\n")
+
+def fits_in_memory(path: str, memory_limit: int = MEMORY_LIMIT) -> bool:
+    # The file size alone says little about the memory needed, short lines need just as much as long ones.
+    # Counting the lines is a plain read of the file, which is cheap compared to parsing it
+    return count_lines(path) * IN_MEMORY_BYTES_PER_LINE + CHUNK_SIZE * CHUNK_BYTES_FACTOR <= memory_limit
+
+def external_sizes(path: str, memory_limit: int = MEMORY_LIMIT) -> tuple[int, int]:
+    # Returns the run size (in bytes of input text) and the merge block size (in values) for the external sort.
+    # Half of the limit goes to parsing and sorting one run, the other half to the blocks read from every
+    # run of both columns while merging
+    run_size = max(memory_limit // 2 // RUN_BYTES_FACTOR, 1 << 16)
+    runs = max(-(-os.path.getsize(path) // run_size), 1)
+    block_size = min(max(memory_limit // 2 // (2 * runs * array('q').itemsize), 1 << 10), RUN_BLOCK_SIZE)
+    return run_size, block_size
+
+def spill_runs(path: str, run_size: int, directory: str) -> tuple[list[str], list[str]]:
+    # Every chunk of the input gets sorted on its own and spilled to disk as a run
+    runs_a = []
+    runs_b = []
+    for i, (chunk_a, chunk_b) in enumerate(iter_input_chunks(path, run_size)):
+        runs_a.append(spill_run(chunk_a, directory, f"a-{i}.bin"))
+        runs_b.append(spill_run(chunk_b, directory, f"b-{i}.bin"))
+    return runs_a, runs_b
+
+def merge_spilled(runs: list[str], block_size: int = RUN_BLOCK_SIZE) -> Iterator[int]:
+    # Lazy k-way merge of spilled runs
+    return heapq.merge(*(iter_run(run, block_size) for run in runs))
+
+def similarity_sorted(sorted_a: Iterable[int], sorted_b: Iterable[int]) -> int:
+    # Merge join of both sorted columns: every value on the left contributes value * occurrences on the right
+    sorted_b = iter(sorted_b)
+    b = next(sorted_b, None)
+    similarity = 0
+    for value, group in groupby(sorted_a):
+        while b is not None and b < value:
+            b = next(sorted_b, None)
+        count_in_b = 0
+        while b == value:
+            count_in_b += 1
+            b = next(sorted_b, None)
+        if count_in_b:
+            similarity += value * count_in_b * sum(1 for _ in group)
+    return similarity
+
+def total_distance_external(path: str = "input.txt", run_size: int = CHUNK_SIZE, tmp_dir: str | None = None,
+                            block_size: int = RUN_BLOCK_SIZE) -> int:
+    # External merge sort: the runs of each column get merged lazily and are only paired on the fly
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as directory:
+        runs_a, runs_b = spill_runs(path, run_size, directory)
+        merged_a = merge_spilled(runs_a, block_size)
+        merged_b = merge_spilled(runs_b, block_size)
+        return sum(map(abs, map(sub, merged_a, merged_b)))
+
+def solve_external(path: str = "input.txt", run_size: int = CHUNK_SIZE, tmp_dir: str | None = None,
+                   block_size: int = RUN_BLOCK_SIZE) -> tuple[int, int]:
+    # Both parts from the same spilled runs: one merge pairs the columns up, a second one joins them
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as directory:
+        runs_a, runs_b = spill_runs(path, run_size, directory)
+        distance = sum(map(abs, map(sub, merge_spilled(runs_a, block_size), merge_spilled(runs_b, block_size))))
+        similarity = similarity_sorted(merge_spilled(runs_a, block_size), merge_spilled(runs_b, block_size))
+    return distance, similarity
+
+def total_distance_file(path: str = "input.txt", memory_limit: int = MEMORY_LIMIT) -> int:
+    if fits_in_memory(path, memory_limit):
+        list_a, list_b = parse_input_columns(path, as_numpy=True)
+        return total_distance(list_a, list_b)
+    run_size, block_size = external_sizes(path, memory_limit)
+    return total_distance_external(path, run_size, block_size=block_size)
+
+def similarity_score(list_a: Column, list_b: Column) -> int:
+    if np is not None and isinstance(list_a, np.ndarray) and isinstance(list_b, np.ndarray):
+        # Count the occurrences in b and look up each element of a in the sorted unique values
+        values, counts = np.unique(list_b, return_counts=True)
+        if len(values) == 0:
+            return 0
+        idx = np.searchsorted(values, list_a).clip(0, len(values) - 1)
+        found = values[idx] == list_a
+        return int((list_a[found] * counts[idx[found]]).sum())
 
-def similarity_score(list_a: list[int], list_b: list[int]) -> int:
     # Create a dict to hold the number of occurrences of each number
     # Since a dict is basically a hashmap, reading from it should be fast
     # There is also the list_b.count(e) function, but using it would
@@ -33,10 +192,137 @@ def similarity_score(list_a: list[int], list_b: list[int]) -> int:
     for e in list_a:
         similarity += e * count_in_b.get(e, 0)
 
-    print(count_in_b)
+    instrument.debug(lambda: str(count_in_b))
+
+    return similarity
+
+def parse_chunk(data: bytes) -> ColumnPair:
+    # Any whitespace separates the values, so they alternate between the left and the right column
+    if np is not None:
+        # NumPy parses the whole chunk in C, without creating a Python object per value
+        # It reads a chunk of only whitespace as a single 0, so those are skipped
+        if not data or data.isspace():
+            return array('q'), array('q')
+        values = np.fromstring(data, dtype=np.int64, sep=" ")
+        if len(values) % 2 != 0:
+            raise ValueError("input chunk has an odd number of values")
+        return array('q', values[0::2].tobytes()), array('q', values[1::2].tobytes())
+
+    values = data.split()
+    if len(values) % 2 != 0:
+        raise ValueError("input chunk has an odd number of values")
+    return array('q', map(int, values[0::2])), array('q', map(int, values[1::2]))
+
+def iter_input_chunks(path: str = "input.txt", chunk_size: int = CHUNK_SIZE, start: int = 0, end: int | None = None) -> Generator[ColumnPair, None, None]:
+    # Read the file in large binary chunks. Only complete lines get parsed, the incomplete rest of each chunk
+    # is carried over into the next one. Memory usage only depends on chunk_size, not on the size of the file
+    # start and end limit reading to a byte range of the file, they need to be on line boundaries
+    remainder = b""
+    with open(path, "rb") as f:
+        f.seek(start)
+        left = end - start if end is not None else -1
+        while left != 0:
+            chunk = f.read(chunk_size if left < 0 else min(chunk_size, left))
+            if not chunk:
+                break
+            if left > 0:
+                left -= len(chunk)
+            chunk = remainder + chunk
+            cut = chunk.rfind(b"\n") + 1
+            remainder = chunk[cut:]
+            if cut > 0:
+                yield parse_chunk(chunk[:cut])
 
+    # The last line might not end with a line break
+    if remainder.strip():
+        yield parse_chunk(remainder)
+
+def shard_ranges(path: str, shards: int) -> list[tuple[int, int]]:
+    # Split the file into byte ranges of roughly the same size. Every boundary gets moved forward to the start
+    # of the next line, so each shard only contains complete lines
+    size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, "rb") as f:
+        for i in range(1, shards):
+            f.seek(max(size * i // shards - 1, 0))
+            f.readline()
+            boundary = f.tell()
+            if boundaries[-1] < boundary < size:
+                boundaries.append(boundary)
+    boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+# Sorted runs and histograms of both columns of one shard
+ShardSummary = tuple[Column, Column, Counter, Counter]
+
+def count_column(column: Column) -> Counter:
+    if np is not None and isinstance(column, np.ndarray):
+        values, counts = np.unique(column, return_counts=True)
+        return Counter(dict(zip(values.tolist(), counts.tolist())))
+    return Counter(column)
+
+def shard_summary(path: str, start: int, end: int) -> ShardSummary:
+    # Worker: parse one shard once and return everything both parts need from it
+    list_a = array('q')
+    list_b = array('q')
+    for chunk_a, chunk_b in iter_input_chunks(path, start=start, end=end):
+        list_a.extend(chunk_a)
+        list_b.extend(chunk_b)
+    if np is not None:
+        list_a = np.frombuffer(list_a, dtype=np.int64)
+        list_b = np.frombuffer(list_b, dtype=np.int64)
+    return sorted_column(list_a), sorted_column(list_b), count_column(list_a), count_column(list_b)
+
+def summarize_shards(path: str = "input.txt", workers: int | None = None) -> list[ShardSummary]:
+    # The parallel part: a single pool parses every shard exactly once
+    ranges = shard_ranges(path, workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(shard_summary, repeat(path), *zip(*ranges)))
+
+def merge_runs(runs: list[Column]) -> Iterable[int]:
+    # k-way merge of sorted runs. NumPy's stable sort is a timsort for int64, which finds the runs and merges them
+    if np is not None and all(isinstance(run, np.ndarray) for run in runs):
+        return np.sort(np.concatenate(runs), kind="stable")
+    return heapq.merge(*runs)
+
+def merged_distance(summaries: list[ShardSummary]) -> int:
+    # Serial step: merge the sorted runs of all shards, the merged columns are still only paired on the fly
+    merged_a = merge_runs([summary[0] for summary in summaries])
+    merged_b = merge_runs([summary[1] for summary in summaries])
+    if np is not None and isinstance(merged_a, np.ndarray) and isinstance(merged_b, np.ndarray):
+        return int(np.abs(merged_a - merged_b).sum())
+    return sum(map(abs, map(sub, merged_a, merged_b)))
+
+def merged_similarity(summaries: list[ShardSummary]) -> int:
+    # Serial step: add up the histograms of all shards
+    count_in_a = Counter()
+    count_in_b = Counter()
+    for _, _, shard_a, shard_b in summaries:
+        count_in_a.update(shard_a)
+        count_in_b.update(shard_b)
+
+    # Every occurrence of a value on the left contributes value * occurrences on the right
+    similarity = 0
+    for e, count in count_in_a.items():
+        similarity += e * count * count_in_b.get(e, 0)
     return similarity
 
+def solve_sharded(path: str = "input.txt", workers: int | None = None) -> tuple[int, int]:
+    summaries = summarize_shards(path, workers)
+    return merged_distance(summaries), merged_similarity(summaries)
+
+def parse_input_columns(path: str = "input.txt", chunk_size: int = CHUNK_SIZE, as_numpy: bool = False) -> tuple[Column, Column]:
+    list_a = array('q')
+    list_b = array('q')
+
+    for chunk_a, chunk_b in iter_input_chunks(path, chunk_size):
+        list_a.extend(chunk_a)
+        list_b.extend(chunk_b)
+
+    # np.frombuffer does not copy, the NumPy arrays share the memory of the array('q') buffers
+    if as_numpy and np is not None:
+        return np.frombuffer(list_a, dtype=np.int64), np.frombuffer(list_b, dtype=np.int64)
+    return list_a, list_b
 
 def parse_input(path: str = "input.txt") -> tuple[list[int], list[int]]:
     list_a = []
@@ -51,12 +337,46 @@ def parse_input(path: str = "input.txt") -> tuple[list[int], list[int]]:
 
     return list_a, list_b
 
-if __name__ == '__main__':
-    list_a, list_b = parse_input()
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Day 1: Historian Hysteria")
+    parser.add_argument("input", nargs="?", default="input.txt", help="input file to use")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="number of worker processes, more than 1 enables the sharded mode")
+    parser.add_argument("-m", "--memory-limit", type=int, default=MEMORY_LIMIT >> 20,
+                        help="memory limit in MiB, larger inputs are solved with an external merge sort")
+    return parser.parse_args()
+
+def load_columns(path: str) -> tuple[Column, Column]:
+    # The parsed columns are cached as raw buffers, so parsing a file again is only a read
+    # NumPy columns (when available) are sorted and compared without going through Python ints
+    return cache.cached("day01-columns", cache.source_version(__file__), path, lambda: parse_input_columns(path, as_numpy=True))
+
+def solve(path: str, workers: int = 1, memory_limit: int = MEMORY_LIMIT) -> tuple[int, int]:
+    if workers > 1:
+        with instrument.phase("summarize_shards"):
+            summaries = summarize_shards(path, workers)
+        with instrument.phase("merge_shards"):
+            return merged_distance(summaries), merged_similarity(summaries)
+
+    if not fits_in_memory(path, memory_limit):
+        with instrument.phase("solve_external"):
+            run_size, block_size = external_sizes(path, memory_limit)
+            return solve_external(path, run_size, block_size=block_size)
+
+    with instrument.phase("parse"):
+        list_a, list_b = load_columns(path)
     assert len(list_a) == len(list_b), "lists have different length"
 
-    distance = total_distance(list_a, list_b)
-    print(f"Total distance: {distance}\n")
+    with instrument.phase("total_distance"):
+        distance = total_distance(list_a, list_b)
+    with instrument.phase("similarity_score"):
+        similarity = similarity_score(list_a, list_b)
+    return distance, similarity
 
-    similarity = similarity_score(list_a, list_b)
+if __name__ == '__main__':
+    args = parse_args()
+
+    # Unchanged inputs are answered from the result cache without parsing them at all
+    distance, similarity = cache.cached("day01", cache.source_version(__file__), args.input, lambda: solve(args.input, args.workers, args.memory_limit << 20))
+    print(f"Total distance: {distance}\n")
     print(f"Similarity score: {similarity}\n")
@@ -0,0 +1,50 @@
+import argparse
+import random
+import time
+
+from main import FilterMode, filter_reports, filter_reports_fast
+
+def generate_reports(count: int, seed: int = 1) -> list[list[int]]:
+    # Mostly monotonic reports with small steps, so a good share of them is safe or almost safe
+    rng = random.Random(seed)
+    reports = []
+    for _ in range(count):
+        direction = rng.choice((-1, 1))
+        level = rng.randint(10, 90)
+        levels = [level]
+        for _ in range(rng.randint(4, 7)):
+            level += direction * rng.choice((0, 1, 1, 2, 2, 3, 3, 4, -1))
+            levels.append(level)
+        reports.append(levels)
+    return reports
+
+def generate_input(path: str, count: int, seed: int = 1):
+    # Same format as the real input: one report per line, levels separated by spaces
+    with open(path, "w") as f:
+        for levels in generate_reports(count, seed):
+            f.write(" ".join(map(str, levels)))
+            f.write("\n")
+
+def time_filter(filter_function, reports: list[list[int]], safe_threshold: int, repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = sum(1 for _ in filter_function(reports, safe_threshold, FilterMode.SAFE))
+        best = min(best, time.perf_counter() - start)
+    return best, count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare filter_reports and filter_reports_fast")
+    parser.add_argument("-n", "--reports", type=int, default=1_000_000)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-s", "--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    reports = generate_reports(args.reports, args.seed)
+    for safe_threshold in (0, 1):
+        old_time, old_count = time_filter(filter_reports, reports, safe_threshold, args.repeat)
+        new_time, new_count = time_filter(filter_reports_fast, reports, safe_threshold, args.repeat)
+        assert old_count == new_count, "filters disagree"
+        print(f"safe_threshold={safe_threshold}: filter_reports {old_time:.3f}s, "
+              f"filter_reports_fast {new_time:.3f}s ({old_time / new_time:.2f}x), {new_count} safe")
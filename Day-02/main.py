@@ -1,5 +1,29 @@
+import asyncio
+import os
+import sys
+from array import array
 from enum import Enum
-from typing import Generator
+from operator import sub
+from typing import Callable, Generator, Iterable
+
+# The shared helpers live in the aoc package at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aoc import cache, instrument
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is optional and only needed for the batch mode
+    np = None
+
+# Receives every report together with its classification when streaming
+ReportSink = Callable[[list[int], bool], None]
+
+# Roughly the amount of bytes read per batch when streaming, and the number of batches that may be queued
+STREAM_BATCH_SIZE = 1 << 16
+STREAM_MAX_BATCHES = 8
+# Amount of bytes parsed at once by the batch mode, the temporary arrays only ever cover one chunk
+RAGGED_CHUNK_SIZE = 1 << 20
 
 class Direction(Enum):
     SAME = 0
@@ -10,6 +34,12 @@ class FilterMode(Enum):
     SAFE = 1,
     UNSAFE = 2
 
+class ThresholdMode(Enum):
+    # safe_threshold is the number of unsafe levels a report may contain
+    COUNT_VIOLATIONS = 1
+    # safe_threshold is the number of levels that may be removed to make a report safe ("problem dampener")
+    REMOVE_LEVELS = 2
+
 class UnsafeException(Exception):
     pass
 
@@ -64,11 +94,148 @@ def filter_reports(reports: list[list[int]], safe_threshold: int = 0, filter_mod
         elif filter_mode is FilterMode.UNSAFE and unsafe_counter > safe_threshold:
             yield levels
 
-def filter_safe(reports: list[list[int]], safe_threshold: int = 0):
-    return filter_reports(reports, safe_threshold, FilterMode.SAFE)
+def count_violations(levels: list[int], safe_threshold: int = 0, max_diff: int = 3) -> int:
+    # Same rules as filter_reports, but working on the differences between neighbouring levels with plain
+    # integer comparisons. direction is 0 until the first valid step, then 1 (increasing) or -1 (decreasing)
+    # Counting stops as soon as the report can't be safe anymore, so the result is capped at safe_threshold + 1
+    unsafe_counter = 0
+    direction = 0
+    for diff in map(sub, levels[1:], levels[:-1]):
+        # A step against the direction has a different sign, so the product is negative
+        if diff == 0 or diff > max_diff or diff < -max_diff or diff * direction < 0:
+            unsafe_counter += 1
+            if unsafe_counter > safe_threshold:
+                break
+        elif direction == 0:
+            direction = 1 if diff > 0 else -1
+    return unsafe_counter
+
+def min_removals(levels: list[int], max_removals: int, direction: int, max_diff: int = 3) -> int:
+    # removals[i] is the smallest number of levels that need to be removed so that the levels up to i form a safe
+    # report that keeps level i. As we may not remove more than max_removals levels, the previous kept level is one
+    # of the max_removals + 1 levels right before i, so each level only needs to look at a window of that size.
+    # That makes it O(n * k). For k = 1 the window holds the prefix (i - 1) and the skip (i - 2) case
+    n = len(levels)
+    removals = [0] * n
+    for i in range(n):
+        # Dropping every level before i is always possible
+        best = i
+        for previous in range(max(i - max_removals - 1, 0), i):
+            step = (levels[i] - levels[previous]) * direction
+            if 1 <= step <= max_diff:
+                best = min(best, removals[previous] + i - previous - 1)
+        removals[i] = best
+
+    # Every level after the last kept one gets removed as well
+    return min((removals[i] + n - 1 - i for i in range(n)), default=0)
+
+def can_be_made_safe(levels: list[int], max_removals: int, max_diff: int = 3) -> bool:
+    # Cheap check first, most reports are either already safe or need at least one removal
+    if count_violations(levels, 0, max_diff) == 0:
+        return True
+    return any(min_removals(levels, max_removals, direction, max_diff) <= max_removals for direction in (1, -1))
+
+def is_safe_report(levels: list[int], safe_threshold: int = 0, threshold_mode: ThresholdMode = ThresholdMode.COUNT_VIOLATIONS) -> bool:
+    if threshold_mode is ThresholdMode.REMOVE_LEVELS:
+        return can_be_made_safe(levels, safe_threshold)
+    return count_violations(levels, safe_threshold) <= safe_threshold
+
+def filter_reports_fast(reports: Iterable[list[int]], safe_threshold: int = 0, filter_mode: FilterMode = FilterMode.SAFE,
+                        threshold_mode: ThresholdMode = ThresholdMode.COUNT_VIOLATIONS) -> Generator[list[int], None, None]:
+    # Yields exactly the same reports as filter_reports, without raising an exception for every unsafe level
+    want_safe = filter_mode is FilterMode.SAFE
+    for levels in reports:
+        if is_safe_report(levels, safe_threshold, threshold_mode) is want_safe:
+            yield levels
+
+def filter_safe(reports: list[list[int]], safe_threshold: int = 0, threshold_mode: ThresholdMode = ThresholdMode.COUNT_VIOLATIONS):
+    return filter_reports_fast(reports, safe_threshold, FilterMode.SAFE, threshold_mode)
+
+def filter_unsafe(reports: list[list[int]], safe_threshold: int = 0, threshold_mode: ThresholdMode = ThresholdMode.COUNT_VIOLATIONS):
+    return filter_reports_fast(reports, safe_threshold, FilterMode.UNSAFE, threshold_mode)
+
+def parse_ragged_chunk(chunk: bytes, first_level: int) -> tuple["np.ndarray", "np.ndarray"]:
+    # Parses complete lines. Returns the levels and the offset of the end of every line, counted from first_level
+    # A level starts wherever a non whitespace character follows whitespace (or starts the chunk). The number of
+    # starts before each line break gives the offsets without looking at the lines in Python
+    raw = np.frombuffer(chunk, dtype=np.uint8)
+    is_space = np.isin(raw, np.frombuffer(b" \t\r\n\v\f", dtype=np.uint8))
+    starts = ~is_space
+    starts[1:] &= is_space[:-1]
+    start_positions = np.flatnonzero(starts)
+    del is_space, starts
+    line_ends = np.flatnonzero(raw == ord("\n"))
+    if len(start_positions) == 0:
+        # Only empty lines, fromstring would parse the whitespace as a single 0
+        return np.empty(0, dtype=np.int64), np.searchsorted(start_positions, line_ends) + first_level
+
+    try:
+        chunk_values = np.fromstring(chunk, dtype=np.int64, sep=" ")
+    except ValueError:
+        raise ValueError(f"invalid level in input: {chunk[:80]!r}") from None
+    if len(start_positions) != len(chunk_values):
+        raise ValueError(f"invalid level in input: {chunk[:80]!r}")
+    return chunk_values, np.searchsorted(start_positions, line_ends) + first_level
+
+def parse_input_ragged(path: str = "input.txt", chunk_size: int = RAGGED_CHUNK_SIZE) -> tuple["np.ndarray", "np.ndarray"]:
+    if np is None:
+        raise ImportError("the batch mode requires NumPy")
+
+    # All levels are stored in one flat array. The levels of report i are values[offsets[i]:offsets[i + 1]]
+    # The file is parsed in chunks of complete lines. The results are collected in array('q') buffers, which grow
+    # in place and are handed to NumPy without a copy, so the peak memory stays close to the size of the result
+    values = array('q')
+    offsets = array('q', [0])
+    remainder = b""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if chunk:
+                chunk = remainder + chunk
+                cut = chunk.rfind(b"\n") + 1
+                chunk, remainder = chunk[:cut], chunk[cut:]
+            else:
+                # The last line might not end with a line break
+                chunk, remainder = (remainder + b"\n" if remainder else b""), b""
+            if chunk:
+                chunk_values, chunk_offsets = parse_ragged_chunk(chunk, len(values))
+                values.frombytes(chunk_values.tobytes())
+                offsets.frombytes(chunk_offsets.astype(np.int64).tobytes())
+            elif not remainder:
+                break
+
+    return np.frombuffer(values, dtype=np.int64), np.frombuffer(offsets, dtype=np.int64)
+
+def safe_mask(values: "np.ndarray", offsets: "np.ndarray", safe_threshold: int = 0, max_diff: int = 3) -> "np.ndarray":
+    if np is None:
+        raise ImportError("the batch mode requires NumPy")
 
-def filter_unsafe(reports: list[list[int]], safe_threshold: int = 0):
-    return filter_reports(reports, safe_threshold, FilterMode.UNSAFE)
+    # Vectorized version of count_violations for all reports at once, it returns a boolean mask of safe reports
+    report_count = len(offsets) - 1
+    lengths = np.diff(offsets)
+
+    # Differences between neighbouring levels, without the ones crossing from one report into the next
+    # The last level of each report has no neighbour in the same report
+    has_next = np.ones(len(values), dtype=bool)
+    has_next[offsets[1:][lengths > 0] - 1] = False
+    diffs = np.diff(values)[has_next[:-1]]
+    report_ids = np.repeat(np.arange(report_count), np.maximum(lengths - 1, 0))
+
+    signs = np.sign(diffs)
+    valid = (diffs != 0) & (np.abs(diffs) <= max_diff)
+
+    # The direction of a report is taken from its first valid step
+    direction = np.zeros(report_count, dtype=np.int64)
+    valid_reports, first_valid = np.unique(report_ids[valid], return_index=True)
+    direction[valid_reports] = signs[valid][first_valid]
+
+    against_direction = valid & (signs * direction[report_ids] < 0)
+    unsafe_counter = np.bincount(report_ids, weights=~valid | against_direction, minlength=report_count)
+    return unsafe_counter <= safe_threshold
+
+def count_safe_batch(path: str = "input.txt", safe_threshold: int = 0) -> int:
+    values, offsets = parse_input_ragged(path)
+    return int(safe_mask(values, offsets, safe_threshold).sum())
 
 def parse_input(path: str = "input.txt") -> list[list[int]]:
     reports = []
@@ -81,14 +248,93 @@ def parse_input(path: str = "input.txt") -> list[list[int]]:
 
     return reports
 
-if __name__ == '__main__':
-    reports = parse_input()
+def iter_reports(path: str = "input.txt") -> Generator[list[int], None, None]:
+    # Lazy version of parse_input, only one report is held in memory at a time
+    with open(path) as f:
+        for line in f:
+            yield list(map(int, line.split()))
+
+def count_reports(reports: Iterable[list[int]], safe_threshold: int = 0, threshold_mode: ThresholdMode = ThresholdMode.COUNT_VIOLATIONS,
+                  sink: ReportSink | None = None) -> tuple[int, int]:
+    # Classify the reports one by one and only keep the counts. Every report can optionally be passed on to a sink
+    safe_count = 0
+    unsafe_count = 0
+    for levels in reports:
+        is_safe = is_safe_report(levels, safe_threshold, threshold_mode)
+        if is_safe:
+            safe_count += 1
+        else:
+            unsafe_count += 1
+        if sink is not None:
+            sink(levels, is_safe)
+    return safe_count, unsafe_count
 
+async def read_reports_async(path: str, queue: asyncio.Queue, batch_size: int):
+    # Producer: read batches of lines in a worker thread so several files can be read concurrently
+    # The queue is bounded, so the producer waits whenever the consumer falls behind
+    with open(path) as f:
+        while True:
+            lines = await asyncio.to_thread(f.readlines, batch_size)
+            if not lines:
+                break
+            await queue.put([list(map(int, line.split())) for line in lines])
+
+async def count_reports_async(paths: Iterable[str], safe_threshold: int = 0, threshold_mode: ThresholdMode = ThresholdMode.COUNT_VIOLATIONS,
+                              sink: ReportSink | None = None, batch_size: int = STREAM_BATCH_SIZE, max_batches: int = STREAM_MAX_BATCHES) -> tuple[int, int]:
+    # At most max_batches batches (roughly batch_size bytes each) are in flight, no matter how large the inputs are
+    queue: asyncio.Queue = asyncio.Queue(max_batches)
+
+    async def produce_all():
+        readers = [asyncio.create_task(read_reports_async(path, queue, batch_size)) for path in paths]
+        try:
+            await asyncio.gather(*readers)
+        except BaseException:
+            # One failing file (e.g. an invalid level) stops the others, the error is raised by await producer
+            for reader in readers:
+                reader.cancel()
+            raise
+        finally:
+            # The consumer always gets its sentinel, otherwise it would wait for the next batch forever
+            await queue.put(None)
+
+    producer = asyncio.create_task(produce_all())
+    safe_count = 0
+    unsafe_count = 0
+    try:
+        while (batch := await queue.get()) is not None:
+            batch_safe, batch_unsafe = count_reports(batch, safe_threshold, threshold_mode, sink)
+            safe_count += batch_safe
+            unsafe_count += batch_unsafe
+    except BaseException:
+        # Make sure a failing consumer (e.g. a raising sink) does not leave the producers hanging
+        producer.cancel()
+        raise
+    await producer
+    return safe_count, unsafe_count
+
+def count_reports_streaming(paths: Iterable[str] = ("input.txt",), safe_threshold: int = 0, threshold_mode: ThresholdMode = ThresholdMode.COUNT_VIOLATIONS,
+                            sink: ReportSink | None = None) -> tuple[int, int]:
+    return asyncio.run(count_reports_async(paths, safe_threshold, threshold_mode, sink))
+
+def count_safe(path: str = "input.txt", safe_threshold: int = 0, threshold_mode: ThresholdMode = ThresholdMode.COUNT_VIOLATIONS) -> int:
+    # Unchanged inputs are answered from the result cache without reading the reports again
+    return cache.cached("day02-safe", cache.source_version(__file__), path,
+                        lambda: count_reports(iter_reports(path), safe_threshold, threshold_mode)[0],
+                        safe_threshold=safe_threshold, threshold_mode=threshold_mode)
+
+if __name__ == '__main__':
     # Part 1
-    safe_reports = list(filter_safe(reports))
-    print(f"Count of safe reports: {len(safe_reports)}")
+    with instrument.phase("part one"):
+        safe_count = count_safe()
+    print(f"Count of safe reports: {safe_count}")
 
     # Part 2
     safe_threshold = 1
-    safe_reports = list(filter_safe(reports, safe_threshold))
-    print(f"Count of safe reports with safe_threshold = {safe_threshold}: {len(safe_reports)}")
+    with instrument.phase("part two"):
+        safe_count = count_safe(safe_threshold=safe_threshold)
+    print(f"Count of safe reports with safe_threshold = {safe_threshold}: {safe_count}")
+
+    # Part 2 with the problem dampener actually removing levels
+    with instrument.phase("part two remove levels"):
+        safe_count = count_safe(safe_threshold=safe_threshold, threshold_mode=ThresholdMode.REMOVE_LEVELS)
+    print(f"Count of safe reports when removing up to {safe_threshold} levels: {safe_count}")
@@ -0,0 +1,63 @@
+import argparse
+import os
+import random
+import string
+import tempfile
+import time
+
+from main import AntennaMap, get_antinode_positions, get_distances
+
+# Valid frequencies are alphanumerical characters
+FREQUENCIES = string.ascii_letters + string.digits
+
+def generate_input(path: str, size: int, antennas: int, seed: int = 1, frequencies: int = len(FREQUENCIES)):
+    # Square map with the given number of antennas placed on random free cells
+    rng = random.Random(seed)
+    grid = [["."] * size for _ in range(size)]
+    cells = rng.sample(range(size * size), min(antennas, size * size))
+    for cell in cells:
+        x, y = divmod(cell, size)
+        grid[x][y] = rng.choice(FREQUENCIES[:frequencies])
+
+    with open(path, "w") as f:
+        for row in grid:
+            f.write("".join(row))
+            f.write("\n")
+
+def time_call(function, repeat: int) -> tuple[float, object]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare get_antinode_positions with the AntennaMap engines")
+    parser.add_argument("--input", default=None, help="use an existing input file instead of generating one")
+    parser.add_argument("--size", type=int, default=500)
+    parser.add_argument("-n", "--antennas", type=int, default=2000)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-s", "--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = args.input
+        if input_file is None:
+            input_file = os.path.join(directory, "input.txt")
+            generate_input(input_file, args.size, args.antennas, args.seed)
+
+        antenna_map = AntennaMap.from_file(input_file)
+        distances = get_distances(antenna_map.positions)
+        old_time, old_result = time_call(lambda: (
+            len(get_antinode_positions(distances, antenna_map.width, antenna_map.height)),
+            len(get_antinode_positions(distances, antenna_map.width, antenna_map.height, inline=True)),
+        ), args.repeat)
+        # A fresh map every time, as AntennaMap caches its grids
+        new_time, new_result = time_call(lambda: (
+            (fresh_map := AntennaMap.from_file(input_file)).antinode_count(), fresh_map.antinode_count(inline=True)
+        ), args.repeat)
+        assert old_result == new_result, f"results differ: {old_result} != {new_result}"
+        print(f"get_antinode_positions {old_time:.3f}s, AntennaMap {new_time:.3f}s ({old_time / new_time:.2f}x), "
+              f"antinodes {new_result}")
@@ -1,7 +1,26 @@
-from typing import Dict
+import argparse
+import glob
+import os
+import re
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from math import gcd, isqrt
+from typing import Dict, Iterable
+
+# The shared helpers live in the aoc package at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aoc import cache, instrument
+from aoc.grid import Grid
 
 PositionsPerFrequency = Dict[str, list[tuple[int, int]]]
 Distances = Dict[tuple[int, int], list[tuple[int, int]]]
+# A line through the field: reduced direction (dx, dy) and the constant c of the equation dy * x - dx * y = c
+Line = tuple[int, int, int]
+
+# valid frequencies are always alphanumerical characters
+ANTENNA_PATTERN = re.compile(rb"[0-9A-Za-z]")
 
 def get_positions(rows: list[str]) -> PositionsPerFrequency:
     positions: PositionsPerFrequency = {}
@@ -17,6 +36,13 @@ def get_positions(rows: list[str]) -> PositionsPerFrequency:
                 positions[c].append((x, y))
     return positions
 
+def get_grid_positions(grid: Grid) -> PositionsPerFrequency:
+    # Same as get_positions, but the antennas are found by a regex scan over the raw grid instead of per character
+    positions: PositionsPerFrequency = {}
+    for x, y, value in grid.find_all(ANTENNA_PATTERN):
+        positions.setdefault(chr(value), []).append((x, y))
+    return positions
+
 def get_distances(positions: PositionsPerFrequency) -> Distances:
     distances: Distances = {}
 
@@ -32,8 +58,9 @@ def get_distances(positions: PositionsPerFrequency) -> Distances:
                     distances[pos].append(dis)
     return distances
 
-def get_antinode_positions(distances: Distances, inline: bool = False) -> set[tuple[int, int]]:
-    is_in_field = lambda x, y: 0 <= x < len(rows) and 0 <= y < len(rows[x])
+def get_antinode_positions(distances: Distances, width: int, height: int, inline: bool = False) -> set[tuple[int, int]]:
+    # The dimensions are passed in once instead of looking at the rows on every probe
+    is_in_field = lambda x, y: 0 <= x < height and 0 <= y < width
 
     # Create a set to save our antinode positions to
     # There can be multiple antinodes at a position, but we only need it once
@@ -62,26 +89,311 @@ def get_antinode_positions(distances: Distances, inline: bool = False) -> set[tu
     # Only return a unique set of antinodes
     return antinodes
 
+def mark_line(grid: bytearray, width: int, height: int, x: int, y: int, dx: int, dy: int, first_only: bool):
+    # Mark the antinodes starting at (x, y) and moving by (dx, dy) until we leave the field
+    while 0 <= x < height and 0 <= y < width:
+        grid[x * width + y] = 1
+        if first_only:
+            return
+        x += dx
+        y += dy
 
-def parse_input(path: str = "input.txt") -> list[str]:
-    rows = []
+def get_antinode_grids(positions: PositionsPerFrequency, width: int, height: int) -> tuple[bytearray, bytearray]:
+    # One byte per cell for each part, a cell is 1 if there is an antinode on it. The cell (x, y) is at x * width + y
+    # Compared to a set of tuples this needs a single allocation and no hashing
+    part_one = bytearray(width * height)
+    part_two = bytearray(width * height)
 
-    # Read the input file. It's a matrix of antennas with different frequencies
-    with open(path) as f:
-        for line in f:
-            rows.append(line.strip())
+    # Each unordered pair of antennas only gets visited once. Antinodes are created on both sides of the pair,
+    # so a pair handles the work of both ordered pairs get_distances would produce
+    for pos_list in positions.values():
+        for (ax, ay), (bx, by) in combinations(pos_list, 2):
+            dx, dy = ax - bx, ay - by
 
-    return rows
+            # Part 1: only the first antinode behind each antenna
+            mark_line(part_one, width, height, ax + dx, ay + dy, dx, dy, True)
+            mark_line(part_one, width, height, bx - dx, by - dy, -dx, -dy, True)
 
-if __name__ == '__main__':
-    rows = parse_input()
-    positions = get_positions(rows)
-    distances = get_distances(positions)
+            # Part 2: everything in line, starting at the antennas themselves
+            mark_line(part_two, width, height, ax, ay, dx, dy, False)
+            mark_line(part_two, width, height, bx, by, -dx, -dy, False)
+
+    return part_one, part_two
+
+def get_line(a: tuple[int, int], b: tuple[int, int]) -> Line:
+    # Reduce the direction by the gcd so the line hits every grid cell on it, and normalize the sign,
+    # so collinear antenna pairs always end up with the exact same line
+    dx, dy = a[0] - b[0], a[1] - b[1]
+    divisor = gcd(dx, dy)
+    dx, dy = dx // divisor, dy // divisor
+    if dx < 0 or (dx == 0 and dy < 0):
+        dx, dy = -dx, -dy
+    return dx, dy, dy * a[0] - dx * a[1]
+
+def get_lines(positions: PositionsPerFrequency) -> set[Line]:
+    return {get_line(a, b) for pos_list in positions.values() for a, b in combinations(pos_list, 2)}
+
+def clip_range(start: int, step: int, size: int) -> tuple[int, int]:
+    # Range of t for which 0 <= start + t * step < size, the range is empty if the lower bound exceeds the upper one
+    if step == 0:
+        return (-(1 << 62), 1 << 62) if 0 <= start < size else (1, 0)
+    if step > 0:
+        return -(start // step), (size - 1 - start) // step
+    return -((size - 1 - start) // -step), start // -step
+
+def extended_gcd(a: int, b: int) -> tuple[int, int, int]:
+    # Returns g, p, q with a * p + b * q == g == gcd(a, b) (up to the sign of g)
+    old_r, r = a, b
+    old_p, p = 1, 0
+    old_q, q = 0, 1
+    while r != 0:
+        quotient = old_r // r
+        old_r, r = r, old_r - quotient * r
+        old_p, p = p, old_p - quotient * p
+        old_q, q = q, old_q - quotient * q
+    return old_r, old_p, old_q
+
+def line_segment(line: Line, width: int, height: int) -> tuple[int, int, int] | None:
+    # Clip the line to the field in closed form. Returns the first cell (x, y) and the number of cells on the line
+    dx, dy, c = line
+    # Any grid point on the line works as the anchor, solve dy * x - dx * y = c with the extended euclid
+    # As the direction is reduced, g is always 1 or -1
+    g, p, q = extended_gcd(dy, -dx)
+    x0, y0 = p * c // g, q * c // g
+
+    x_lo, x_hi = clip_range(x0, dx, height)
+    y_lo, y_hi = clip_range(y0, dy, width)
+    t_lo, t_hi = max(x_lo, y_lo), min(x_hi, y_hi)
+    if t_lo > t_hi:
+        return None
+    return x0 + t_lo * dx, y0 + t_lo * dy, t_hi - t_lo + 1
+
+def get_line_antinode_grid(positions: PositionsPerFrequency, width: int, height: int) -> bytearray:
+    # Part 2 with one line per antenna pair, lines shared by collinear antennas are only handled once
+    # Every line is clipped to the field in closed form and its cells are marked with one slice assignment
+    grid = bytearray(width * height)
+    for line in get_lines(positions):
+        segment = line_segment(line, width, height)
+        if segment is None:
+            continue
+        x, y, count = segment
+        start = x * width + y
+        # The direction is normalized, so the step in the flat grid is always positive
+        step = line[0] * width + line[1]
+        grid[start:start + step * (count - 1) + 1:step] = b"\x01" * count
+    return grid
+
+def count_line_antinodes(positions: PositionsPerFrequency, width: int, height: int) -> int:
+    # Count-only version of get_line_antinode_grid that never touches the cells of the lines.
+    # The count is the sum of all line lengths, minus the cells that are shared by several lines: a cell hit by
+    # m lines was counted m times but should only count once. Those cells are intersections of two lines
+    # Intersecting every pair of lines is O(L^2) for L lines, which only beats marking the cells while the number
+    # of pairs stays below the number of cells. Beyond that the grid is counted instead
+    lines = list(get_lines(positions))
+    if len(lines) * (len(lines) - 1) // 2 > width * height:
+        return get_line_antinode_grid(positions, width, height).count(1)
+
+    total = 0
+    for line in lines:
+        segment = line_segment(line, width, height)
+        if segment is not None:
+            total += segment[2]
+
+    lines_per_cell: dict[tuple[int, int], int] = {}
+    for i, (dx1, dy1, c1) in enumerate(lines):
+        for dx2, dy2, c2 in lines[i + 1:]:
+            determinant = dx1 * dy2 - dy1 * dx2
+            # Parallel lines never meet, the lines are unique so they can't be the same line either
+            if determinant == 0:
+                continue
+            x_num = dx1 * c2 - dx2 * c1
+            y_num = dy1 * c2 - dy2 * c1
+            if x_num % determinant or y_num % determinant:
+                continue
+            x, y = x_num // determinant, y_num // determinant
+            if 0 <= x < height and 0 <= y < width:
+                lines_per_cell[(x, y)] = lines_per_cell.get((x, y), 0) + 1
+
+    # With m lines through a cell there are m * (m - 1) / 2 intersecting pairs, but only m - 1 duplicates
+    for pair_count in lines_per_cell.values():
+        lines_through = (1 + isqrt(1 + 8 * pair_count)) // 2
+        total -= lines_through - 1
+    return total
+
+def count_antinodes(rows: list[str]) -> tuple[int, int]:
+    # The field is expected to be rectangular
+    height = len(rows)
+    width = len(rows[0]) if rows else 0
+    part_one, part_two = get_antinode_grids(get_positions(rows), width, height)
+    return part_one.count(1), part_two.count(1)
+
+class AntennaMap:
+    def __init__(self, rows: list[str] | Grid):
+        # The field is expected to be rectangular, so the dimensions only need to be stored once
+        if isinstance(rows, Grid):
+            self.height = rows.height
+            self.width = rows.width
+            self.positions = get_grid_positions(rows)
+        else:
+            self.height = len(rows)
+            self.width = len(rows[0]) if rows else 0
+            self.positions = get_positions(rows)
+        self._grids: tuple[bytearray, bytearray] | None = None
 
-    # Part 1
-    antinode_positions = get_antinode_positions(distances)
-    print(f"Antinodes found: {len(antinode_positions)}")
+    @classmethod
+    def from_file(cls, path: str = "input.txt") -> "AntennaMap":
+        with Grid.open(path) as grid:
+            return cls(grid)
+
+    @classmethod
+    def from_positions(cls, positions: PositionsPerFrequency, width: int, height: int) -> "AntennaMap":
+        antenna_map = cls([])
+        antenna_map.width = width
+        antenna_map.height = height
+        antenna_map.positions = positions
+        return antenna_map
+
+    @classmethod
+    def load(cls, path: str = "input.txt") -> "AntennaMap":
+        # Like from_file, but the antennas are cached as plain data, so an unchanged map is never scanned again
+        def parse() -> tuple[PositionsPerFrequency, int, int]:
+            antenna_map = cls.from_file(path)
+            return antenna_map.positions, antenna_map.width, antenna_map.height
+        return cls.from_positions(*cache.cached("day08-antennas", cache.source_version(__file__), path, parse))
+
+    def is_in_field(self, x: int, y: int) -> bool:
+        return 0 <= x < self.height and 0 <= y < self.width
+
+    def grids(self) -> tuple[bytearray, bytearray]:
+        # Both parts come out of the same pass, so compute them once and keep them
+        if self._grids is None:
+            self._grids = get_antinode_grids(self.positions, self.width, self.height)
+        return self._grids
+
+    def antinodes(self, inline: bool = False) -> set[tuple[int, int]]:
+        grid = self.grids()[1 if inline else 0]
+        return {divmod(i, self.width) for i, cell in enumerate(grid) if cell}
+
+    def antinode_count(self, inline: bool = False) -> int:
+        return self.grids()[1 if inline else 0].count(1)
+
+    def line_antinode_count(self, count_only: bool = False) -> int:
+        # Part 2 where every grid cell in line with two antennas counts, even between them
+        if count_only:
+            return count_line_antinodes(self.positions, self.width, self.height)
+        return get_line_antinode_grid(self.positions, self.width, self.height).count(1)
+
+class AntinodeTracker:
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.positions: PositionsPerFrequency = {}
+        # Number of antenna pairs creating an antinode on each cell, for Part 1 and Part 2
+        # A cell counts as an antinode as long as its reference count is above 0
+        self.references = (array('I', [0]) * (width * height), array('I', [0]) * (width * height))
+        self.counts = [0, 0]
+
+    @classmethod
+    def from_map(cls, antenna_map: AntennaMap) -> "AntinodeTracker":
+        tracker = cls(antenna_map.width, antenna_map.height)
+        for frequency, pos_list in antenna_map.positions.items():
+            for pos in pos_list:
+                tracker.add_antenna(frequency, pos)
+        return tracker
+
+    @property
+    def antinode_count(self) -> int:
+        return self.counts[0]
+
+    @property
+    def inline_antinode_count(self) -> int:
+        return self.counts[1]
+
+    def add_antenna(self, frequency: str, pos: tuple[int, int]):
+        # Only the pairs with the antennas of the same frequency change
+        pos_list = self.positions.setdefault(frequency, [])
+        for other in pos_list:
+            self._update_pair(pos, other, 1)
+        pos_list.append(pos)
+
+    def remove_antenna(self, frequency: str, pos: tuple[int, int]):
+        pos_list = self.positions.get(frequency, [])
+        pos_list.remove(pos)
+        for other in pos_list:
+            self._update_pair(pos, other, -1)
+
+    def _update_pair(self, a: tuple[int, int], b: tuple[int, int], delta: int):
+        # Same antinodes as get_antinode_grids creates for a pair
+        dx, dy = a[0] - b[0], a[1] - b[1]
+        self._update_line(0, a[0] + dx, a[1] + dy, dx, dy, True, delta)
+        self._update_line(0, b[0] - dx, b[1] - dy, -dx, -dy, True, delta)
+        self._update_line(1, a[0], a[1], dx, dy, False, delta)
+        self._update_line(1, b[0], b[1], -dx, -dy, False, delta)
+
+    def _update_line(self, part: int, x: int, y: int, dx: int, dy: int, first_only: bool, delta: int):
+        references = self.references[part]
+        while 0 <= x < self.height and 0 <= y < self.width:
+            i = x * self.width + y
+            references[i] += delta
+            # Only a change from or to 0 changes the number of unique antinodes
+            if delta > 0 and references[i] == 1:
+                self.counts[part] += 1
+            elif delta < 0 and references[i] == 0:
+                self.counts[part] -= 1
+            if first_only:
+                return
+            x += dx
+            y += dy
+
+def score_map_file(path: str) -> tuple[int, int]:
+    # Unchanged maps are answered from the result cache, the map is only loaded when a count is missing
+    antenna_map: AntennaMap | None = None
+
+    def antinode_count(inline: bool) -> int:
+        nonlocal antenna_map
+        if antenna_map is None:
+            with instrument.phase("parse"):
+                antenna_map = AntennaMap.load(path)
+        with instrument.phase("antinodes"):
+            return antenna_map.antinode_count(inline)
+
+    version = cache.source_version(__file__)
+    return tuple(cache.cached("day08-antinodes", version, path, lambda: antinode_count(inline), inline=inline) for inline in (False, True))
+
+def score_map_files(paths: Iterable[str], workers: int | None = None) -> dict[str, tuple[int, int]]:
+    # Every map is independent, so each one can be scored in its own process
+    paths = list(paths)
+    with ProcessPoolExecutor(workers) as executor:
+        return dict(zip(paths, executor.map(score_map_file, paths)))
+
+def collect_map_files(paths: Iterable[str]) -> list[str]:
+    # Directories are expanded to all .txt files they contain
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.txt"))))
+        else:
+            files.append(path)
+    return files
+
+def parse_input(path: str = "input.txt") -> list[str]:
+    # Read the input file. It's a matrix of antennas with different frequencies
+    # The file is memory mapped and every row is decoded straight from the mapping
+    with Grid.open(path) as grid:
+        return [row.tobytes().decode() for row in grid.rows()]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Day 8: Resonant Collinearity")
+    parser.add_argument("inputs", nargs="*", default=["input.txt"], help="map files or directories of map files")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of worker processes for many maps")
+    args = parser.parse_args()
 
-    # Part 2
-    inline_antinode_positions = get_antinode_positions(distances, inline=True)
-    print(f"Inline Antinodes found: {len(inline_antinode_positions)}")
\ No newline at end of file
+    map_files = collect_map_files(args.inputs)
+    if len(map_files) == 1:
+        # Part 1 and Part 2 are both computed in a single pass over the antenna pairs
+        antinode_count, inline_antinode_count = score_map_file(map_files[0])
+        print(f"Antinodes found: {antinode_count}")
+        print(f"Inline Antinodes found: {inline_antinode_count}")
+    else:
+        for path, (antinode_count, inline_antinode_count) in score_map_files(map_files, args.workers).items():
+            print(f"{path}: Antinodes found: {antinode_count}, Inline Antinodes found: {inline_antinode_count}")
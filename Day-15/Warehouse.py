@@ -0,0 +1,384 @@
+import random
+import struct
+from array import array
+from itertools import chain, islice
+from typing import BinaryIO, Iterable, Iterator
+
+from Robot import Robot
+from util import ParsedMap, Direction
+
+# Cells are stored as their ASCII value, which keeps the grid readable when dumped
+WALL, EMPTY, BOX, BOX_LEFT, BOX_RIGHT = b"#.O[]"
+
+# Directions are plain ints. They index into the deltas of a warehouse, vertical directions come first
+UP, DOWN, LEFT, RIGHT = range(4)
+DIRECTION_CODES = {"^": UP, "v": DOWN, "<": LEFT, ">": RIGHT}
+# The Direction for each code, so DIRECTIONS[code] turns a code back into a Direction
+DIRECTIONS = (Direction.UP, Direction.DOWN, Direction.LEFT, Direction.RIGHT)
+# Translation table turning the direction characters of the input into their codes in a single C call
+DIRECTION_TABLE = bytes.maketrans(b"^v<>", bytes((UP, DOWN, LEFT, RIGHT)))
+
+# Amount of bytes of the move script decoded at once when streaming
+CHUNK_SIZE = 1 << 20
+# Runs up to this length are done move by move by run_batched, scanning ahead only pays off for longer runs
+SHORT_RUN = 3
+
+# Checkpoint header: magic, width, robot index, number of moves done. The raw grid follows right after it
+CHECKPOINT_HEADER = struct.Struct("<4sQQQ")
+CHECKPOINT_MAGIC = b"WH15"
+# Fixed seed, so state hashes of different runs (and of loaded checkpoints) can be compared
+ZOBRIST_SEED = 15
+
+def direction_code(direction: Direction) -> int:
+    return DIRECTION_CODES[direction.value]
+
+def iter_direction_codes(path: str, offset: int = 0, chunk_size: int = CHUNK_SIZE) -> Iterator[int]:
+    # Lazily decode the move script starting at offset. Only one chunk is held in memory at a time,
+    # no matter how long the script is. Line breaks are dropped, anything else has to be a direction
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while chunk := f.read(chunk_size):
+            codes = chunk.translate(DIRECTION_TABLE, b"\r\n")
+            if codes and max(codes) > RIGHT:
+                raise ValueError(f"invalid direction in move script: {chunk!r}")
+            yield from codes
+
+def box_offsets(cells: bytes) -> int:
+    # Sum of the positions of all boxes (their left side for wide boxes) within cells
+    return sum(i for i, value in enumerate(cells) if value == BOX or value == BOX_LEFT)
+
+class DirectionStream:
+    def __init__(self, path: str, offset: int = 0, chunk_size: int = CHUNK_SIZE):
+        # A move script that is decoded lazily from the file. Every iteration reads the file again from offset,
+        # so the same stream can drive several simulations and can be sent to other processes
+        self.path = path
+        self.offset = offset
+        self.chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[Direction]:
+        return (DIRECTIONS[code] for code in self.codes())
+
+    def codes(self) -> Iterator[int]:
+        return iter_direction_codes(self.path, self.offset, self.chunk_size)
+
+class Warehouse:
+    def __init__(self, grid: bytearray, width: int, robot: int, check_gps: bool = False, track_hash: bool = False):
+        # The whole map lives in one flat bytearray, the cell (x, y) is at y * width + x
+        # The robot is just the index of its cell
+        self.grid = grid
+        self.width = width
+        self.height = len(grid) // width if width else 0
+        self.robot = robot
+        # Moving in a direction is a single addition to the index
+        self.deltas = (-width, width, -1, 1)
+        # Wide boxes (Part 2) can't be pushed vertically in bulk
+        self.has_wide_boxes = BOX_LEFT in grid
+        # Running GPS sum, updated whenever boxes move. With check_gps, run() compares it to a full scan after every move
+        self._gps = self.calc_gps()
+        self.check_gps = check_gps
+
+        # Zobrist hashing of the state: every cell has a random key for a box starting there and one for the robot
+        # standing on it. The hash of the boxes is the XOR of the keys of all boxes, so moving a box only takes two
+        # XORs. The robot is added when the hash is read. Only one kind of box exists per grid, so one key table is enough
+        self.box_keys: array | None = None
+        self.robot_keys: array | None = None
+        self._box_hash = 0
+        if track_hash:
+            rng = random.Random(ZOBRIST_SEED)
+            self.box_keys = array('Q', (rng.getrandbits(64) for _ in range(len(grid))))
+            self.robot_keys = array('Q', (rng.getrandbits(64) for _ in range(len(grid))))
+            self._box_hash = self.calc_box_hash()
+
+    @classmethod
+    def from_parsed_map(cls, parsed_map: ParsedMap, robot: Robot, check_gps: bool = False, track_hash: bool = False) -> "Warehouse":
+        width = len(parsed_map[0]) if parsed_map else 0
+        grid = bytearray("".join("".join(row) for row in parsed_map), "ascii")
+        return cls(grid, width, robot.y * width + robot.x, check_gps, track_hash)
+
+    def dump(self, f: BinaryIO, moves: int = 0):
+        # Checkpoint of the current state after the given number of moves. The grid is written straight from its
+        # buffer, without converting or copying it
+        f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, self.width, self.robot, moves))
+        f.write(memoryview(self.grid))
+
+    @classmethod
+    def load(cls, f: BinaryIO, check_gps: bool = False, track_hash: bool = False) -> tuple["Warehouse", int]:
+        # Restore a checkpoint written by dump. Returns the warehouse and the number of moves to skip in the script
+        magic, width, robot, moves = CHECKPOINT_HEADER.unpack(f.read(CHECKPOINT_HEADER.size))
+        if magic != CHECKPOINT_MAGIC:
+            raise ValueError("not a warehouse checkpoint")
+        grid = bytearray(f.read())
+        return cls(grid, width, robot, check_gps, track_hash), moves
+
+    @property
+    def state_hash(self) -> int:
+        if self.robot_keys is None:
+            raise ValueError("state hashing is disabled, create the warehouse with track_hash=True")
+        return self._box_hash ^ self.robot_keys[self.robot]
+
+    def calc_box_hash(self) -> int:
+        box_hash = 0
+        for value in (BOX, BOX_LEFT):
+            i = self.grid.find(value)
+            while i >= 0:
+                box_hash ^= self.box_keys[i]
+                i = self.grid.find(value, i + 1)
+        return box_hash
+
+    def run_periodic(self, pattern: list[int], repeats: int) -> int:
+        # Run a script that repeats pattern the given number of times. The state is hashed at the start of every
+        # repetition. Once a state comes up again, the warehouse is in a cycle and all full cycles left can be skipped
+        if self.box_keys is None:
+            raise ValueError("cycle detection needs state hashing, create the warehouse with track_hash=True")
+        seen: dict[int, int] | None = {}
+        i = 0
+        while i < repeats:
+            if seen is not None:
+                state_hash = self.state_hash
+                if state_hash in seen:
+                    cycle = i - seen[state_hash]
+                    i += (repeats - i) // cycle * cycle
+                    seen = None
+                    continue
+                seen[state_hash] = i
+            self.run(pattern)
+            i += 1
+        return self._gps
+
+    def resume(self, codes: Iterable[int], moves: int) -> int:
+        # Continue a script from a checkpoint, the first moves codes have already been executed
+        return self.run(islice(codes, moves, None))
+
+    @property
+    def gps(self) -> int:
+        return self._gps
+
+    def gps_at(self, i: int) -> int:
+        y, x = divmod(i, self.width)
+        return 100 * y + x
+
+    def verify_gps(self):
+        full_gps = self.calc_gps()
+        if full_gps != self._gps:
+            raise AssertionError(f"running GPS sum {self._gps} differs from full scan {full_gps}")
+
+    def to_parsed_map(self) -> ParsedMap:
+        text = self.grid.decode("ascii")
+        return [list(text[y * self.width:(y + 1) * self.width]) for y in range(self.height)]
+
+    def robot_pos(self) -> tuple[int, int]:
+        y, x = divmod(self.robot, self.width)
+        return x, y
+
+    def run(self, codes: Iterable[int]) -> int:
+        move = self.move
+        if self.check_gps:
+            for code in codes:
+                move(code)
+                self.verify_gps()
+        else:
+            for code in codes:
+                move(code)
+        return self._gps
+
+    def run_batched(self, codes: Iterable[int]) -> int:
+        # The move script is grouped into runs of the same direction, e.g. ">>>>^^" is (RIGHT, 4), (UP, 2)
+        # The first SHORT_RUN moves of every run are done right away, only the rest of a longer run is collected and
+        # done by move_run once the run ends. A script of short runs costs little more than run() that way
+        # The -1 at the end ends the last run. It never starts a run of its own, so an empty script makes no move
+        move = self.move
+        move_run = self.move_run
+        check_gps = self.check_gps
+        run_code = None
+        count = 0
+        for code in chain(codes, (-1,)):
+            if code == run_code and code >= 0:
+                count += 1
+                if count <= SHORT_RUN:
+                    move(code)
+                continue
+            if count > SHORT_RUN:
+                move_run(run_code, count - SHORT_RUN)
+            if check_gps and count:
+                self.verify_gps()
+            if code >= 0:
+                move(code)
+            run_code = code
+            count = 1
+        return self._gps
+
+    def move_run(self, code: int, count: int):
+        # Same result as calling move(code) count times
+        if count <= 1:
+            # Not worth scanning ahead for a single move
+            if count == 1:
+                self.move(code)
+            return
+        if code < LEFT and self.has_wide_boxes:
+            self.move_run_wide_vertical(code, count)
+            return
+
+        # Along a single line, pushing only ever compacts the boxes: every step uses up the first empty cell in front
+        # of the boxes the robot pushes. After count steps (or when only walls and boxes are left) the cells up to the
+        # last used empty cell hold those empty cells first, followed by the boxes in their original order
+        grid = self.grid
+        delta = self.deltas[code]
+        pos = self.robot
+        empties = 0
+        last_empty = pos
+        while empties < count:
+            pos += delta
+            value = grid[pos]
+            if value == WALL:
+                break
+            if value == EMPTY:
+                empties += 1
+                last_empty = pos
+
+        if empties == 0:
+            return
+        # The line is taken as an extended slice in ascending order, so the order is flipped when moving backwards
+        step = abs(delta)
+        if delta > 0:
+            line = slice(self.robot + delta, last_empty + 1, step)
+        else:
+            line = slice(last_empty, self.robot, step)
+        old_cells = grid[line]
+        boxes = old_cells.replace(b".", b"")
+        new_cells = b"." * empties + boxes if delta > 0 else boxes + b"." * empties
+        grid[line] = new_cells
+        self.robot += empties * delta
+        if self.box_keys is not None:
+            self.toggle_box_keys(old_cells, line.start, step)
+            self.toggle_box_keys(new_cells, line.start, step)
+
+        # Along a row or column the GPS coordinate grows linearly with the position in the line
+        slope = 1 if step == 1 else 100
+        self._gps += slope * (box_offsets(new_cells) - box_offsets(old_cells))
+
+    def move_run_wide_vertical(self, code: int, count: int):
+        # Slide across empty cells without going through move, only pushing boxes takes a regular move
+        grid = self.grid
+        delta = self.deltas[code]
+        while count > 0:
+            target = self.robot + delta
+            if grid[target] == EMPTY:
+                self.robot = target
+                count -= 1
+                continue
+            start = self.robot
+            self.move(code)
+            # Nothing changes between the moves of a run, so if this push was blocked, all others are as well
+            if self.robot == start:
+                return
+            count -= 1
+
+    def move(self, code: int):
+        grid = self.grid
+        delta = self.deltas[code]
+        target = self.robot + delta
+        cell = grid[target]
+
+        if cell == EMPTY:
+            self.robot = target
+        elif cell == WALL:
+            return
+        elif cell == BOX:
+            # Part 1: a chain of boxes moves if there is an empty cell behind it. Instead of shifting every box,
+            # the first box moves to the end of the chain
+            end = target + delta
+            while grid[end] == BOX:
+                end += delta
+            if grid[end] == EMPTY:
+                grid[end] = BOX
+                grid[target] = EMPTY
+                self.robot = target
+                self._gps += self.gps_at(end) - self.gps_at(target)
+                if self.box_keys is not None:
+                    self._box_hash ^= self.box_keys[end] ^ self.box_keys[target]
+        elif code >= LEFT:
+            self.push_wide_horizontal(target, delta)
+        else:
+            self.push_wide_vertical(target, delta)
+
+    def push_wide_horizontal(self, target: int, delta: int):
+        # Part 2 moving sideways: the boxes form a single row, so the whole run of box cells shifts by one
+        grid = self.grid
+        end = target + delta
+        while grid[end] == BOX_LEFT or grid[end] == BOX_RIGHT:
+            end += delta
+        if grid[end] != EMPTY:
+            return
+        if self.box_keys is not None:
+            self.toggle_box_keys(grid[min(target, end):max(target, end) + 1], min(target, end), 1)
+        if delta > 0:
+            grid[target + 1:end + 1] = grid[target:end]
+        else:
+            grid[end:target] = grid[end + 1:target + 1]
+        grid[target] = EMPTY
+        if self.box_keys is not None:
+            self.toggle_box_keys(grid[min(target, end):max(target, end) + 1], min(target, end), 1)
+        self.robot = target
+        # Every box in between moved one step sideways
+        self._gps += (end - target) // 2
+
+    def push_wide_vertical(self, target: int, delta: int):
+        boxes = self.find_moveable_boxes(target, delta)
+        if boxes is None:
+            return
+        grid = self.grid
+        # The boxes are ordered from the robot outwards, so the farthest box moves first and always has room
+        for box in reversed(boxes):
+            grid[box] = EMPTY
+            grid[box + 1] = EMPTY
+            grid[box + delta] = BOX_LEFT
+            grid[box + delta + 1] = BOX_RIGHT
+        self.robot = target
+        self._gps += len(boxes) * (100 if delta > 0 else -100)
+        if self.box_keys is not None:
+            for box in boxes:
+                self._box_hash ^= self.box_keys[box] ^ self.box_keys[box + delta]
+
+    def find_moveable_boxes(self, target: int, delta: int) -> list[int] | None:
+        # Breadth first search, one row of boxes at a time. Every box (stored as the index of its left cell)
+        # is visited only once, and the result is already in the order the boxes have to be moved in
+        grid = self.grid
+        frontier = [target if grid[target] == BOX_LEFT else target - 1]
+        visited = set(frontier)
+        boxes: list[int] = []
+        while frontier:
+            boxes.extend(frontier)
+            next_frontier = []
+            for box in frontier:
+                for cell in (box + delta, box + delta + 1):
+                    value = grid[cell]
+                    if value == WALL:
+                        return None
+                    if value == EMPTY:
+                        continue
+                    next_box = cell if value == BOX_LEFT else cell - 1
+                    if next_box not in visited:
+                        visited.add(next_box)
+                        next_frontier.append(next_box)
+            frontier = next_frontier
+        return boxes
+
+    def toggle_box_keys(self, cells: bytes, start: int, step: int):
+        # XOR the keys of all boxes in cells, which are the grid cells start, start + step, ...
+        box_keys = self.box_keys
+        for i, value in enumerate(cells):
+            if value == BOX or value == BOX_LEFT:
+                self._box_hash ^= box_keys[start + i * step]
+
+    def calc_gps(self) -> int:
+        # Same as calc_gps in main, but searching the flat grid for box cells instead of looking at every cell
+        grid = self.grid
+        width = self.width
+        total = 0
+        for value in (BOX, BOX_LEFT):
+            i = grid.find(value)
+            while i >= 0:
+                y, x = divmod(i, width)
+                total += 100 * y + x
+                i = grid.find(value, i + 1)
+        return total
@@ -0,0 +1,82 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import main
+from Warehouse import Warehouse, direction_code
+from util import Mode
+
+def generate_input(path: str, size: int, moves: int, seed: int = 1, box_ratio: float = 0.15, wall_ratio: float = 0.05, max_run: int = 1):
+    # Square warehouse surrounded by walls with randomly placed boxes and walls, and the robot in the middle
+    rng = random.Random(seed)
+    rows = []
+    for y in range(size):
+        row = []
+        for x in range(size):
+            if x in (0, size - 1) or y in (0, size - 1):
+                row.append("#")
+            elif (x, y) == (size // 2, size // 2):
+                row.append("@")
+            else:
+                value = rng.random()
+                row.append("O" if value < box_ratio else "#" if value < box_ratio + wall_ratio else ".")
+        rows.append("".join(row))
+
+    with open(path, "w") as f:
+        f.write("\n".join(rows))
+        f.write("\n\n")
+        # Every direction is repeated between 1 and max_run times, like ">>>>>" in real move scripts
+        written = 0
+        while written < moves:
+            line = "".join(rng.choice("^v<>") * rng.randint(1, max_run) for _ in range(1000 // max_run + 1))
+            line = line[:moves - written]
+            f.write(line)
+            f.write("\n")
+            written += len(line)
+
+def time_move_loop(path: str, part: Mode) -> tuple[float, int]:
+    parsed_input = main.parse_input(path, mode=part)
+    start = time.perf_counter()
+    for direction in parsed_input.directions:
+        main.move(parsed_input.robot, parsed_input.parsed_map, direction, part)
+    elapsed = time.perf_counter() - start
+    return elapsed, main.calc_gps(parsed_input.parsed_map)
+
+def time_warehouse(path: str, part: Mode, batched: bool = False) -> tuple[float, int]:
+    parsed_input = main.parse_input(path, mode=part)
+    warehouse = Warehouse.from_parsed_map(parsed_input.parsed_map, parsed_input.robot)
+    codes = [direction_code(direction) for direction in parsed_input.directions]
+    start = time.perf_counter()
+    if batched:
+        warehouse.run_batched(codes)
+    else:
+        warehouse.run(codes)
+    elapsed = time.perf_counter() - start
+    return elapsed, warehouse.calc_gps()
+
+def run_benchmark(input_file: str):
+    for part in Mode:
+        old_time, old_gps = time_move_loop(input_file, part)
+        new_time, new_gps = time_warehouse(input_file, part)
+        batched_time, batched_gps = time_warehouse(input_file, part, batched=True)
+        assert old_gps == new_gps == batched_gps, f"GPS mismatch for {part}: {old_gps}, {new_gps}, {batched_gps}"
+        print(f"{part.name}: move {old_time:.3f}s, Warehouse {new_time:.3f}s ({old_time / new_time:.2f}x), "
+              f"batched {batched_time:.3f}s ({old_time / batched_time:.2f}x), GPS {new_gps}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the move loop with the flat Warehouse engine")
+    parser.add_argument("--input", default=None, help="use an existing input file instead of generating one")
+    parser.add_argument("-n", "--moves", type=int, default=1_000_000)
+    parser.add_argument("--size", type=int, default=100)
+    parser.add_argument("-s", "--seed", type=int, default=1)
+    parser.add_argument("--max-run", type=int, default=1, help="longest run of the same direction in the script")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = args.input
+        if input_file is None:
+            input_file = os.path.join(directory, "input.txt")
+            generate_input(input_file, args.size, args.moves, args.seed, max_run=args.max_run)
+        run_benchmark(input_file)
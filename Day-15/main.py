@@ -1,16 +1,34 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+
+# The shared helpers live in the aoc package at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aoc import cache, instrument
+from aoc.grid import Grid, expand_columns
+
 from Robot import Robot
 from util import ParsedMap, Direction, Point, Mode
-from copy import deepcopy
-from functools import cmp_to_key
+from Warehouse import DirectionStream, direction_code
 
-mode = Mode.PART_ONE
+# Part 2 doubles every cell of the part 1 map. Walls and empty cells are repeated, a box turns into its two halves
+WIDE_CELL_TABLES = [bytes.maketrans(b"O", b"["), bytes.maketrans(b"O", b"]")]
 
 class Input:
-    def __init__(self, parsed_map: ParsedMap, directions: list[Direction], robot: Robot):
+    def __init__(self, parsed_map: ParsedMap, directions: list[Direction] | DirectionStream, robot: Robot):
         self.parsed_map = parsed_map
+        # Either a list of directions, or a DirectionStream when the directions are streamed from the file
         self.directions = directions
         self.robot = robot
 
+    def iter_direction_codes(self) -> Iterator[int]:
+        # The directions as plain ints, as used by Warehouse
+        if isinstance(self.directions, DirectionStream):
+            return self.directions.codes()
+        return map(direction_code, self.directions)
+
 def get_new_position(start: Point, direction: Direction) -> Point:
     new_x, new_y = start[0], start[1]
     match direction:
@@ -34,8 +52,15 @@ def calc_gps(parsed_map: ParsedMap) -> int:
 
 
 
-def move(robot: Robot, parsed_map: ParsedMap, direction: Direction):
-    global mode
+def get_gps(pos: Point) -> int:
+    # formular taken from task description
+    return (100 * pos[1]) + pos[0]
+
+# Change of the GPS coordinate when a box moves one step into a direction
+GPS_DELTAS = {Direction.UP: -100, Direction.DOWN: 100, Direction.LEFT: -1, Direction.RIGHT: 1}
+
+def move(robot: Robot, parsed_map: ParsedMap, direction: Direction, mode: Mode) -> int:
+    # Returns the change of the GPS sum caused by this move
     new_position = get_new_position(robot.pos(), direction)
     x, y = new_position
     target_cell_value = parsed_map[y][x]
@@ -44,101 +69,69 @@ def move(robot: Robot, parsed_map: ParsedMap, direction: Direction):
     match target_cell_value:
         case '.': robot.move_to(new_position)
         # It's a wall, we can't move
-        case '#': return
+        case '#': return 0
         # A box
         case 'O':
             assert mode is Mode.PART_ONE, "only part 1 should have this value"
-            move_boxes_p1(robot, parsed_map, direction, new_position)
+            return move_boxes_p1(robot, parsed_map, direction, new_position)
         case '['|']':
             assert mode is Mode.PART_TWO, "only part 2 should have this value"
-            moveable = get_moveable_boxes(parsed_map, direction, robot.pos(), [])
+            with instrument.phase("push resolution"):
+                moveable = get_moveable_boxes(parsed_map, direction, robot.pos())
             if moveable:
-                move_boxes_p2(robot, parsed_map, direction, moveable)
+                return move_boxes_p2(robot, parsed_map, direction, moveable)
         case _:
             print(f"ERROR: unknown cell type: {target_cell_value}")
-
-def get_moveable_boxes(parsed_map: ParsedMap, direction: Direction, current_pos: Point, box_stack: list[Point]) -> list[Point]|None:
-    # The box_stack contains the start of a box, so the left side only
-
-
-    new_position = get_new_position(current_pos, direction)
-    new_x, new_y = new_position
-    next_cell_value = parsed_map[new_y][new_x]
-
-    if new_position == (8, 6):
-        pass
-
-    match next_cell_value:
-        # can't move
-        case '#': return None
-        # Next cell is empty so we can move the boxes
-        case '.': return box_stack
-
-
-    if direction.is_vertical():
-        match next_cell_value:
-            case '[':
-                # left side of a box
-                # since we are on the left side of the box, we need to check the right side of the box
-                # the target_pos now points to the right side of the box, as we need to check that one
-                target_pos = new_x + 1, new_y
-
-                # When encountering the left side of a box, we are already at the correct side of the box so we
-                # need to save the boxes position directly to our stack.
-                # Remember: Our stack only contains the left side of a box
-                stack_entry = new_x, new_y
-                new_stack = deepcopy(box_stack)
-                new_stack.append(stack_entry)
-                right_side_stack = get_moveable_boxes(parsed_map, direction, target_pos, new_stack)
-                # If the right side did not hit a wall (did not return None), we need to check the left side as well
-                if right_side_stack is not None:
-                    # if we have the start (left side) of moveable boxes on the right side of the box, we continue with those in mind
-                    return get_moveable_boxes(parsed_map, direction, new_position, right_side_stack)
-                # right side hit a wall, so we can't move anything
-                return None
-            case ']':
-                # right side of a box
-                # target_pos points to the left side, as we need to check that as well
-                target_pos = new_x - 1, new_y
-                new_stack = deepcopy(box_stack)
-                new_stack.append(target_pos)
-
-                left_side_stack = get_moveable_boxes(parsed_map, direction, target_pos, new_stack)
-
-                # If the left side did not hit a wall (did not return None), we need to check the right side as well
-                if left_side_stack is not None:
-                    return get_moveable_boxes(parsed_map, direction, new_position, left_side_stack)
-                return None
-
-    elif direction.is_horizontal():
-        match next_cell_value:
-            case '[':
-                # we hit the left side of the box, meaning new_position points to the start of a box
-                # we can only continue if we are moving into the correct direction
-                # when hitting the left side of a box we need to move right to move it
-                if direction is Direction.RIGHT:
-                    target_pos = new_x + 1, new_y
-                    # as our stack saves the start of boxes, we need to add new_position directly
-                    stack_entry = new_x, new_y
-                    new_stack = deepcopy(box_stack)
-                    new_stack.append(stack_entry)
-                    return get_moveable_boxes(parsed_map, direction, target_pos, new_stack)
-            case ']':
-                # we hit the right side of the box, meaning new_position points to the end of a box
-                # we can only continue if we are moving into the correct direction
-                # when hitting the right side of a box we need to move left to move it
-                if direction is Direction.LEFT:
-                    target_pos = new_x - 1, new_y
-                    new_stack = deepcopy(box_stack)
-                    # we need to move one step to the left to find the start of the box, so instead of new_position
-                    # we save target_pos, which got moved already
-                    new_stack.append(target_pos)
-                    return get_moveable_boxes(parsed_map, direction, target_pos, new_stack)
+    return 0
+
+def get_moveable_boxes(parsed_map: ParsedMap, direction: Direction, current_pos: Point) -> list[Point]|None:
+    # Returns the start (left side) of every box that needs to move, ordered from the box directly in front of
+    # current_pos to the one farthest away, or None if any of them is blocked by a wall
+    new_x, new_y = get_new_position(current_pos, direction)
+    box_stack: list[Point] = []
+
+    if direction.is_horizontal():
+        # Moving sideways, the boxes are lined up in a single row, so we just walk along them
+        while parsed_map[new_y][new_x] in "[]":
+            if parsed_map[new_y][new_x] == '[':
+                box_stack.append((new_x, new_y))
+            new_x, new_y = get_new_position((new_x, new_y), direction)
+        return box_stack if parsed_map[new_y][new_x] == '.' else None
+
+    # Moving vertically, a box can push up to two boxes in the next row, which can push more boxes and so on.
+    # We use a breadth first search with one frontier per row. Boxes reached from several boxes (like in a pyramid)
+    # are only visited once thanks to the visited set
+    def box_start(x: int, y: int) -> Point:
+        return (x, y) if parsed_map[y][x] == '[' else (x - 1, y)
+
+    if parsed_map[new_y][new_x] not in "[]":
+        return box_stack if parsed_map[new_y][new_x] == '.' else None
+
+    frontier = [box_start(new_x, new_y)]
+    visited = set(frontier)
+    while frontier:
+        box_stack.extend(frontier)
+        next_frontier = []
+        for box_x, box_y in frontier:
+            # Check the cells in front of both sides of the box
+            for x in (box_x, box_x + 1):
+                _, next_y = get_new_position((x, box_y), direction)
+                next_cell_value = parsed_map[next_y][x]
+                # can't move
+                if next_cell_value == '#':
+                    return None
+                if next_cell_value in "[]":
+                    next_box = box_start(x, next_y)
+                    if next_box not in visited:
+                        visited.add(next_box)
+                        next_frontier.append(next_box)
+        frontier = next_frontier
 
     return box_stack
 
 
-def move_boxes_p1(robot: Robot, parsed_map: ParsedMap, direction: Direction, box_pos: Point):
+def move_boxes_p1(robot: Robot, parsed_map: ParsedMap, direction: Direction, box_pos: Point) -> int:
+    # Returns the change of the GPS sum
     box_stack = [box_pos]
 
     can_move = False
@@ -150,7 +143,7 @@ def move_boxes_p1(robot: Robot, parsed_map: ParsedMap, direction: Direction, box
 
         match next_cell_value:
             # a wall, can't move
-            case '#': return
+            case '#': return 0
             case '.':
                 # we found a free spot behind the box, meaning it can move
                 can_move = True
@@ -163,7 +156,11 @@ def move_boxes_p1(robot: Robot, parsed_map: ParsedMap, direction: Direction, box
         if can_move:
             break
 
+    gps_delta = 0
     if can_move:
+        # Effectively, the first box moved to the free spot at the end of the line
+        gps_delta = get_gps(box_stack[-1]) - get_gps(box_pos)
+
         # We can move, so we can start moving all boxes into the direction we are going
         # We need to move the last box we found first to make room, so we use our list of boxes like a stack
         while len(box_stack) > 0:
@@ -175,30 +172,19 @@ def move_boxes_p1(robot: Robot, parsed_map: ParsedMap, direction: Direction, box
 
         robot.move_to(box_pos)
 
-def move_boxes_p2(robot: Robot, parsed_map: ParsedMap, direction: Direction, moveable: list[Point]):
-    # create a unique set of points as we can move a box only once
-    box_stack = list(set(moveable))
+    return gps_delta
+
+def move_boxes_p2(robot: Robot, parsed_map: ParsedMap, direction: Direction, moveable: list[Point]) -> int:
+    # get_moveable_boxes returns every box once, starting with the box directly in front of the robot
+    # Popping from the end moves the box at the back of the line first, so there is always room for it
+    box_stack = list(moveable)
+    # Every box moves exactly one step, so the GPS sum changes by the same amount for each of them
+    gps_delta = GPS_DELTAS[direction] * len(box_stack)
 
     if len(box_stack) > 0:
         robot_new_pos = get_new_position(robot.pos(), direction)
         robot.move_to(robot_new_pos)
 
-        def compare_box_stack(a: Point, b: Point) -> int:
-            a_x, a_y = a
-            b_x, b_y = b
-            # We need to move the boxes in order. If there is a box at (1, 1) and another at (1, 2) and we are moving UP,
-            # we have to first check whether we can move the box at the back (1, 1) before moving (1, 2)
-            # as we can't move anything if the last box in that direction is blocked
-            # The box at the front of the list is also the box directly in front of us
-            match direction:
-                case Direction.UP: return b_y - a_y
-                case Direction.DOWN: return a_y - b_y
-                case Direction.LEFT: return b_x - a_x
-                case Direction.RIGHT: return a_x - b_x
-
-        # Sort the stack based on the direction
-        box_stack.sort(key=cmp_to_key(compare_box_stack))
-
     while len(box_stack) > 0:
         # Move the boxes in order, starting with the one at the back of the line we have to move
         x, y = box_stack.pop()
@@ -223,111 +209,143 @@ def move_boxes_p2(robot: Robot, parsed_map: ParsedMap, direction: Direction, mov
                 parsed_map[y][x + 1] = '['
                 parsed_map[y][x + 2] = ']'
 
-def parse_input(path: str = "input.txt") -> Input:
-    global mode
-    parsed_map: ParsedMap = []
-    directions: list[Direction] = []
+    return gps_delta
+
+def parse_input(path: str = "input.txt", stream_directions: bool = False, mode: Mode = Mode.PART_ONE) -> Input:
     robot = Robot(0, 0)
 
     # Read the input file. The first half (separated by an empty line) is the map, the 2nd part the list of directions
-    # the robot will follow
-    with open(path) as f:
-        file_iter = iter(f)
-        # Read the map
-        for y, line in enumerate(file_iter):
-            # This is the empty line separating the map from the movement
-            if line == "\n":
-                break
-
-            new_row = []
-            for x, cell in enumerate(line):
-                if mode is Mode.PART_ONE:
-                    parsed = parse_cell_part_one((x, y), cell, robot)
-                    if parsed is not None:
-                        new_row.append(parsed)
-                else:
-                    parsed = parse_cell_part_two((x, y), cell, robot)
-                    if parsed is not None:
-                        new_row.extend(parsed)
-            parsed_map.append(new_row)
-
-        for line in file_iter:
-            new_directions = [Direction(direction) for direction in line.strip("\n")]
-            directions.extend(new_directions)
-
-    return Input(parsed_map, directions, robot)
-
-def parse_cell_part_one(pos: Point, cell: str, robot: Robot) -> str|None:
-    match cell:
-        case "\n": return None
-        case '@':
-            print(f"Robot is at initial position {pos}")
-            robot.move_to(pos)
-            cell = '.'
-    return cell
-
-def parse_cell_part_two(pos: Point, cell: str, robot: Robot) -> list[str]|None:
-    # for part 2, the grid has doubled width
-    row = []
-    match cell:
-        case "\n": return None
-        case '#':
-            row.append('#')
-            row.append('#')
-        case '.':
-            row.append('.')
-            row.append('.')
-        case 'O':
-            # a box is no longer a singular position, but instead has a start and an end
-            row.append('[')
-            row.append(']')
-        case '@':
-            row.append('.')
-            row.append('.')
-            # Adjust the robot position for the double width grid
-            pos = pos[0] * 2, pos[1]
-            print(f"Robot is at initial position {pos}")
-            robot.move_to(pos)
-    return row
+    # the robot will follow. The map is always parsed for part 1, widen_input derives the part 2 map from it
+    # The file is memory mapped, the map rows are cut out of it as a whole instead of going through every cell
+    with Grid.open(path) as grid:
+        width = grid.width
+        cells = grid.data()
+        directions_offset = grid.end
+
+    robot_index = cells.find(b"@")
+    if robot_index >= 0:
+        y, x = divmod(robot_index, width)
+        instrument.debug(f"Robot is at initial position {(x, y)}")
+        robot.move_to((x, y))
+    parsed_map = split_rows(cells.replace(b"@", b".").decode(), width)
+
+    # When streaming, the movement gets decoded lazily chunk by chunk while the simulation is already running
+    direction_stream = DirectionStream(path, directions_offset)
+    parsed_input = Input(parsed_map, direction_stream if stream_directions else list(direction_stream), robot)
+
+    if mode is Mode.PART_TWO:
+        return widen_input(parsed_input)
+    return parsed_input
+
+def split_rows(cells: str, width: int) -> ParsedMap:
+    return [list(cells[start:start + width]) for start in range(0, len(cells), width or 1)]
+
+def widen_input(parsed_input: Input) -> Input:
+    # Derive the double width part 2 map from the part 1 map. The directions are shared between both inputs
+    # Every cell is doubled by two translations of the whole map, so no cell is looked at in Python
+    cells = "".join("".join(row) for row in parsed_input.parsed_map).encode()
+    width = len(parsed_input.parsed_map[0]) * 2 if parsed_input.parsed_map else 0
+    parsed_map = split_rows(expand_columns(cells, WIDE_CELL_TABLES).decode(), width)
+
+    # The robot is not part of the part 1 map anymore, so its position has to be adjusted here
+    robot = Robot(parsed_input.robot.x * 2, parsed_input.robot.y)
+    return Input(parsed_map, parsed_input.directions, robot)
+
+def copy_input(parsed_input: Input) -> Input:
+    # Simulations change the map and the robot, so every simulation needs its own copy
+    parsed_map = [list(row) for row in parsed_input.parsed_map]
+    return Input(parsed_map, parsed_input.directions, Robot(*parsed_input.robot.pos()))
+
+class Simulation:
+    def __init__(self, parsed_input: Input, mode: Mode, check_gps: bool = False):
+        # parsed_input has to match the mode already, its map and robot are changed by the simulation
+        self.parsed_map = parsed_input.parsed_map
+        self.robot = parsed_input.robot
+        self.directions = parsed_input.directions
+        self.mode = mode
+        # When set, the running GPS sum is compared against a full scan of the map after every move
+        self.check_gps = check_gps
+        self.moves = 0
+        # The only full scan, after this the GPS sum gets updated by the changes each move returns
+        self._gps = calc_gps(self.parsed_map)
+
+    @property
+    def gps(self) -> int:
+        return self._gps
+
+    def move(self, direction: Direction):
+        self._gps += move(self.robot, self.parsed_map, direction, self.mode)
+        self.moves += 1
+        if self.check_gps:
+            full_gps = calc_gps(self.parsed_map)
+            if full_gps != self._gps:
+                raise AssertionError(f"running GPS sum {self._gps} differs from full scan {full_gps} after {self.moves} moves")
+
+    def run(self, directions: Iterable[Direction] | None = None) -> int:
+        for direction in directions if directions is not None else self.directions:
+            self.move(direction)
+        return self._gps
+
+def simulate(parsed_input: Input, mode: Mode, check_gps: bool = False) -> int:
+    # Run one simulation on the part 1 input and return its GPS sum, parsed_input itself stays untouched
+    simulation_input = widen_input(parsed_input) if mode is Mode.PART_TWO else copy_input(parsed_input)
+    with instrument.phase(f"simulate {mode.name.lower()}"):
+        return Simulation(simulation_input, mode, check_gps).run()
+
+def simulate_files(paths: Iterable[str], modes: Iterable[Mode] = tuple(Mode), workers: int | None = None) -> dict[tuple[str, Mode], int]:
+    # Every file is parsed once, then each (file, mode) simulation runs in its own process
+    # The directions are streamed, so only the maps need to be sent to the workers
+    # Results of unchanged files come from the result cache, a file is only parsed if one of its results is missing
+    modes = list(modes)
+    version = cache.source_version(__file__)
+    results: dict[tuple[str, Mode], int] = {}
+    pending: dict[str, list[Mode]] = {}
+    for path in paths:
+        for mode in modes:
+            gps = cache.get("day15-gps", version, path, mode=mode)
+            if gps is None:
+                pending.setdefault(path, []).append(mode)
+            else:
+                results[(path, mode)] = gps
+
+    if workers == 1:
+        # Everything runs in this process, so the instrumentation and profilers see the simulations too
+        for path, path_modes in pending.items():
+            with instrument.phase("parse"):
+                parsed_input = parse_input(path, stream_directions=True)
+            for mode in path_modes:
+                results[(path, mode)] = simulate(parsed_input, mode)
+    elif pending:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = {}
+            for path, path_modes in pending.items():
+                with instrument.phase("parse"):
+                    parsed_input = parse_input(path, stream_directions=True)
+                for mode in path_modes:
+                    futures[(path, mode)] = executor.submit(simulate, parsed_input, mode)
+            results.update((key, future.result()) for key, future in futures.items())
+
+    for path, path_modes in pending.items():
+        for mode in path_modes:
+            cache.put("day15-gps", version, path, results[(path, mode)], mode=mode)
+    return results
 
 if __name__ == '__main__':
-    # Specify the input file to use
     # sample_input.txt contains the large example of this AoC task as found on the Day-15 website
-
-    #input_file = "sample_input.txt"
-    input_file = "input.txt"
-
-    run_1 = True
-    run_2 = True
-
-    # Part 1
-    if run_1:
-        print("---- PART ONE ----")
-        # set global mode to PART_ONE
-        # this affects several functions
-        mode = Mode.PART_ONE
-        parsed_input = parse_input(input_file)
-        robot = parsed_input.robot
-        directions = parsed_input.directions
-        parsed_map = parsed_input.parsed_map
-
-        for direction in parsed_input.directions:
-            move(robot, parsed_map, direction)
-
-        result = calc_gps(parsed_map)
-        print(f"GPS sum for part 1: {result}")
-
-    # Part 2
-    if run_2:
-        print("\n---- PART TWO ----")
-        mode = Mode.PART_TWO
-        parsed_input = parse_input(input_file)
-        robot = parsed_input.robot
-        directions = parsed_input.directions
-        parsed_map = parsed_input.parsed_map
-
-        for direction in parsed_input.directions:
-            move(robot, parsed_map, direction)
-
-        result = calc_gps(parsed_map)
-        print(f"GPS sum for part 2: {result}")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Day 15: Warehouse Woes")
+    parser.add_argument("inputs", nargs="*", default=["input.txt"], help="input files to use")
+    parser.add_argument("-p", "--part", type=int, choices=(1, 2), action="append",
+                        help="only run the given part, can be repeated (default: both)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+
+    modes = [Mode.PART_ONE if part == 1 else Mode.PART_TWO for part in sorted(set(args.part or (1, 2)))]
+    results = simulate_files(args.inputs, modes, args.workers)
+
+    for path in args.inputs:
+        if len(args.inputs) > 1:
+            print(f"==== {path} ====")
+        for mode in modes:
+            part = 1 if mode is Mode.PART_ONE else 2
+            print(f"---- PART {'ONE' if part == 1 else 'TWO'} ----")
+            print(f"GPS sum for part {part}: {results[(path, mode)]}")
@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from typing import Callable
+
+from aoc.days import ROOT, load_day_module
+
+# Called once per repetition with the generated input file, returns the function that gets timed
+Setup = Callable[[str], Callable[[], object]]
+
+# Default sizes of each sweep, multiplied by --scale
+SWEEPS = {
+    1: [10_000, 100_000, 1_000_000],
+    2: [10_000, 100_000, 1_000_000],
+    8: [100, 300, 1000],
+    15: [10_000, 100_000, 1_000_000],
+}
+
+def generate_input(day: int, path: str, size: int, seed: int):
+    # size is the number of lines (Day 1), reports (Day 2), the edge length of the map (Day 8)
+    # or the number of moves (Day 15)
+    benchmark = load_day_module(day, "benchmark")
+    if day in (1, 2):
+        benchmark.generate_input(path, size, seed)
+    elif day == 8:
+        # About 2 % of the cells hold an antenna
+        benchmark.generate_input(path, size, max(size * size // 50, 2), seed)
+    elif day == 15:
+        benchmark.generate_input(path, 50, size, seed, max_run=4)
+    else:
+        raise ValueError(f"no input generator for day {day}")
+
+def day_one_cases() -> dict[str, Setup]:
+    main = load_day_module(1)
+
+    def total_distance(path: str):
+        list_a, list_b = main.parse_input(path)
+        return lambda: main.total_distance(list_a, list_b)
+
+    def total_distance_file(path: str):
+        return lambda: main.total_distance_file(path)
+
+    def similarity_score(path: str):
+        list_a, list_b = main.parse_input_columns(path)
+        return lambda: main.similarity_score(list_a, list_b)
+
+    return {"total_distance": total_distance, "total_distance_file": total_distance_file, "similarity_score": similarity_score}
+
+def day_two_cases() -> dict[str, Setup]:
+    main = load_day_module(2)
+
+    def filter_reports(path: str):
+        reports = main.parse_input(path)
+        return lambda: sum(1 for _ in main.filter_reports(reports, 1))
+
+    def filter_reports_fast(path: str):
+        reports = main.parse_input(path)
+        return lambda: sum(1 for _ in main.filter_reports_fast(reports, 1))
+
+    def count_reports(path: str):
+        return lambda: main.count_reports(main.iter_reports(path), 1)
+
+    return {"filter_reports": filter_reports, "filter_reports_fast": filter_reports_fast, "count_reports": count_reports}
+
+def day_eight_cases() -> dict[str, Setup]:
+    main = load_day_module(8)
+
+    def get_antinode_positions(path: str):
+        antenna_map = main.AntennaMap.from_file(path)
+        distances = main.get_distances(antenna_map.positions)
+        return lambda: (
+            len(main.get_antinode_positions(distances, antenna_map.width, antenna_map.height)),
+            len(main.get_antinode_positions(distances, antenna_map.width, antenna_map.height, inline=True)),
+        )
+
+    def count_antinodes(path: str):
+        rows = main.parse_input(path)
+        return lambda: main.count_antinodes(rows)
+
+    return {"get_antinode_positions": get_antinode_positions, "count_antinodes": count_antinodes}
+
+def day_fifteen_cases() -> dict[str, Setup]:
+    main = load_day_module(15)
+    warehouse = load_day_module(15, "Warehouse")
+    util = load_day_module(15, "util")
+
+    def move_loop(mode):
+        def setup(path: str):
+            parsed_input = main.parse_input(path, mode=mode)
+
+            def run():
+                for direction in parsed_input.directions:
+                    main.move(parsed_input.robot, parsed_input.parsed_map, direction, mode)
+                return main.calc_gps(parsed_input.parsed_map)
+            return run
+        return setup
+
+    def warehouse_run(mode):
+        def setup(path: str):
+            parsed_input = main.parse_input(path, mode=mode)
+            codes = list(parsed_input.iter_direction_codes())
+            engine = warehouse.Warehouse.from_parsed_map(parsed_input.parsed_map, parsed_input.robot)
+            return lambda: engine.run(codes)
+        return setup
+
+    return {
+        "move_part_one": move_loop(util.Mode.PART_ONE),
+        "move_part_two": move_loop(util.Mode.PART_TWO),
+        "warehouse_part_one": warehouse_run(util.Mode.PART_ONE),
+        "warehouse_part_two": warehouse_run(util.Mode.PART_TWO),
+    }
+
+CASES: dict[int, Callable[[], dict[str, Setup]]] = {
+    1: day_one_cases,
+    2: day_two_cases,
+    8: day_eight_cases,
+    15: day_fifteen_cases,
+}
+
+def time_case(setup: Setup, path: str, repeat: int) -> tuple[float, object]:
+    # Best of repeat runs, the setup (parsing etc.) is not part of the measured time
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        function = setup(path)
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(days: list[int], scale: float, repeat: int, seed: int, solvers: list[str] | None = None) -> list[dict]:
+    results = []
+    revision = git_revision()
+    with tempfile.TemporaryDirectory() as directory:
+        for day in days:
+            cases = CASES[day]()
+            for size in SWEEPS[day]:
+                size = max(int(size * scale), 1)
+                path = os.path.join(directory, f"day{day:02d}-{size}.txt")
+                generate_input(day, path, size, seed)
+                for name, setup in cases.items():
+                    if solvers and name not in solvers:
+                        continue
+                    seconds, result = time_case(setup, path, repeat)
+                    entry = {
+                        "day": day,
+                        "solver": name,
+                        "size": size,
+                        "seed": seed,
+                        "repeat": repeat,
+                        "seconds": seconds,
+                        "result": repr(result),
+                        "revision": revision,
+                        "python": platform.python_version(),
+                    }
+                    results.append(entry)
+                    print(f"Day {day:2d} {name:<24} size {size:>10}: {seconds:.4f}s")
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the solvers of all days on generated inputs")
+    parser.add_argument("-d", "--day", type=int, action="append", choices=sorted(CASES), help="only run the given day, can be repeated")
+    parser.add_argument("--solver", action="append", help="only run the given solver, can be repeated")
+    parser.add_argument("--scale", type=float, default=1.0, help="factor applied to every size of the sweeps")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("-s", "--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", default="bench_results.jsonl", help="file the results get appended to as JSON lines")
+    args = parser.parse_args()
+
+    benchmark_results = run_benchmarks(args.day or sorted(CASES), args.scale, args.repeat, args.seed, args.solver)
+    with open(args.output, "a") as f:
+        for benchmark_result in benchmark_results:
+            f.write(json.dumps(benchmark_result))
+            f.write("\n")
+    print(f"Wrote {len(benchmark_results)} results to {args.output}")
@@ -0,0 +1,184 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Callable, TypeVar
+
+from aoc.days import ROOT
+
+# On-disk cache for parsed inputs and results. An entry is keyed by the content of the input file, the version of
+# the solver and the parameters it was called with, so changing any of them never returns a stale value.
+# Values are stored with the highest pickle protocol, which writes arrays and bytes as raw buffers.
+# The least recently used entries are evicted once the cache grows beyond its size limit.
+#   AOC_CACHE=0          disable the cache
+#   AOC_CACHE_DIR=<dir>  directory of the cache (default: .aoc_cache in the repository root)
+#   AOC_CACHE_SIZE=<n>   size limit in bytes (default: 256 MiB)
+
+T = TypeVar("T")
+
+DEFAULT_MAX_SIZE = 256 << 20
+SUFFIX = ".bin"
+
+_file_hashes: dict[tuple[str, int, int], str] = {}
+_source_versions: dict[str, str] = {}
+
+def file_hash(path: str) -> str:
+    # The hash is remembered per process as long as the file keeps its size and modification time
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    digest = _file_hashes.get(memo_key)
+    if digest is None:
+        with open(path, "rb") as f:
+            digest = _file_hashes[memo_key] = hashlib.file_digest(f, "blake2b").hexdigest()
+    return digest
+
+def source_version(path: str) -> str:
+    # Version of a solver derived from the source of every module in its directory and of the shared aoc package
+    # (grid loader, runner, ...), so any change to the code invalidates its cached results without having to bump
+    # a version number by hand
+    directory = os.path.dirname(os.path.abspath(path))
+    version = _source_versions.get(directory)
+    if version is None:
+        digest = hashlib.blake2b()
+        for module in sorted(Path(directory).glob("*.py")) + sorted(Path(__file__).parent.glob("*.py")):
+            digest.update(f"{module.parent.name}/{module.name}".encode())
+            digest.update(module.read_bytes())
+        version = _source_versions[directory] = digest.hexdigest()
+    return version
+
+class _EntryTooLarge(Exception):
+    pass
+
+class _LimitedWriter:
+    # File wrapper that gives up as soon as more than limit bytes were written, so a value that can never fit into
+    # the cache is not pickled to disk in full first
+    def __init__(self, f, limit: int):
+        self.f = f
+        self.limit = limit
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.size += memoryview(data).nbytes
+        if self.size > self.limit:
+            raise _EntryTooLarge
+        return self.f.write(data)
+
+class Cache:
+    def __init__(self, directory: str | Path, max_size: int = DEFAULT_MAX_SIZE):
+        self.directory = Path(directory)
+        self.max_size = max_size
+
+    def key(self, name: str, version: str, path: str, **params) -> str:
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{name}\0{version}\0{file_hash(path)}".encode())
+        for param, value in sorted(params.items()):
+            digest.update(f"\0{param}={value!r}".encode())
+        return digest.hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.directory / f"{key}{SUFFIX}"
+
+    def get(self, key: str, default=None):
+        entry = self._entry(key)
+        try:
+            with open(entry, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return default
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Damaged entries or entries of classes that don't exist anymore are treated as missing
+            return default
+        # The modification time is the last use of the entry, eviction removes the oldest ones first
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key: str, value) -> bool:
+        # Returns False if the value was not stored because it is larger than the whole cache
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file first, so concurrent readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        entry = self._entry(key)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, _LimitedWriter(f, self.max_size), pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, entry)
+        except _EntryTooLarge:
+            os.unlink(temp_path)
+            return False
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.evict(keep=entry)
+        return True
+
+    def evict(self, keep: Path | None = None):
+        # keep is never evicted, it is the entry that was just written
+        entries = []
+        total = 0
+        for entry in self.directory.glob(f"*{SUFFIX}"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry != keep:
+                entries.append((stat.st_mtime_ns, stat.st_size, entry))
+            total += stat.st_size
+        if total <= self.max_size:
+            return
+
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= self.max_size:
+                break
+            try:
+                entry.unlink()
+            except FileNotFoundError:
+                # Another process evicted it already
+                pass
+            total -= size
+
+    def clear(self):
+        for entry in self.directory.glob(f"*{SUFFIX}"):
+            entry.unlink(missing_ok=True)
+
+    def cached(self, name: str, version: str, path: str, compute: Callable[[], T], **params) -> T:
+        key = self.key(name, version, path, **params)
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+_default_cache: Cache | None = None
+
+def default_cache() -> Cache | None:
+    global _default_cache
+    if os.environ.get("AOC_CACHE", "1") == "0":
+        return None
+    if _default_cache is None:
+        directory = os.environ.get("AOC_CACHE_DIR") or ROOT / ".aoc_cache"
+        _default_cache = Cache(directory, int(os.environ.get("AOC_CACHE_SIZE", DEFAULT_MAX_SIZE)))
+    return _default_cache
+
+def get(name: str, version: str, path: str, default=None, **params):
+    cache = default_cache()
+    if cache is None:
+        return default
+    return cache.get(cache.key(name, version, path, **params), default)
+
+def put(name: str, version: str, path: str, value, **params):
+    cache = default_cache()
+    if cache is not None:
+        cache.put(cache.key(name, version, path, **params), value)
+
+def cached(name: str, version: str, path: str, compute: Callable[[], T], **params) -> T:
+    # Cached compute() of the default cache, or just compute() when the cache is disabled
+    cache = default_cache()
+    if cache is None:
+        return compute()
+    return cache.cached(name, version, path, compute, **params)
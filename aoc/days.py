@@ -0,0 +1,55 @@
+import importlib
+import re
+import sys
+from pathlib import Path
+from types import ModuleType
+
+# Root of the repository, every day lives in its own Day-XX directory in here
+ROOT = Path(__file__).resolve().parent.parent
+
+_loaded: dict[tuple[int, str], ModuleType] = {}
+
+def find_days() -> dict[int, Path]:
+    # A day is every Day-XX directory that contains a main.py
+    days = {}
+    for main_file in ROOT.glob("Day-*/main.py"):
+        match = re.fullmatch(r"Day-(\d+)", main_file.parent.name)
+        if match:
+            days[int(match.group(1))] = main_file.parent
+    return dict(sorted(days.items()))
+
+def day_dir(day: int) -> Path:
+    return ROOT / f"Day-{day:02d}"
+
+def load_day_module(day: int, name: str = "main") -> ModuleType:
+    # The days are standalone scripts that import their neighbours by plain names (main, util, Robot, ...), and
+    # those names are the same for every day. The day directory goes to the front of sys.path while its modules
+    # get imported, afterwards they are moved to day-specific names so the next day gets its own copies
+    key = (day, name)
+    if key in _loaded:
+        return _loaded[key]
+
+    directory = day_dir(day)
+    local_names = {path.stem for path in directory.glob("*.py")}
+    if name not in local_names:
+        raise ModuleNotFoundError(f"Day {day} has no module {name}")
+
+    # Already loaded modules of this day (e.g. main when loading benchmark) have to be visible while importing
+    saved = {local: sys.modules.pop(local) for local in local_names if local in sys.modules}
+    for (loaded_day, local), module in _loaded.items():
+        if loaded_day == day:
+            sys.modules[local] = module
+
+    sys.path.insert(0, str(directory))
+    try:
+        module = importlib.import_module(name)
+    finally:
+        sys.path.remove(str(directory))
+        for local in local_names:
+            if local in sys.modules:
+                loaded = sys.modules.pop(local)
+                _loaded[(day, local)] = loaded
+                sys.modules[f"day{day:02d}_{local}"] = loaded
+        sys.modules.update(saved)
+
+    return module
@@ -0,0 +1,111 @@
+import mmap
+import re
+from typing import Iterator
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is optional, without it the grid is only available as memoryviews
+    np = None
+
+class Grid:
+    # A character grid at the start of a file, ending at the first empty line or the end of the file.
+    # The file is memory mapped and never decoded, the rows are views into the mapping. Row y starts at
+    # offset y * stride, the stride includes the line break at the end of each row
+    def __init__(self, buffer, width: int, height: int, stride: int):
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+        self.stride = stride
+        # Offset of the first byte after the last row, where the empty line following the grid starts
+        self.end = min(height * stride, len(buffer))
+
+    @classmethod
+    def open(cls, path: str) -> "Grid":
+        with open(path, "rb") as f:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                buffer = b""
+        return cls.from_buffer(buffer)
+
+    @classmethod
+    def from_buffer(cls, buffer) -> "Grid":
+        line_end = buffer.find(b"\n")
+        if line_end < 0:
+            line_end = len(buffer)
+        stride = line_end + 1
+        width = line_end - 1 if line_end > 0 and buffer[line_end - 1] == ord("\r") else line_end
+        if width == 0:
+            return cls(buffer, 0, 0, stride)
+
+        # The grid ends with the first empty line, which is the only place with two line breaks in a row
+        grid_end = buffer.find(b"\n\n")
+        if grid_end < 0:
+            grid_end = buffer.find(b"\n\r\n")
+        if grid_end < 0:
+            grid_end = _content_length(buffer)
+        return cls(buffer, width, (grid_end + stride) // stride, stride)
+
+    def close(self):
+        # Only possible once no row views are left
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def __enter__(self) -> "Grid":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def row(self, y: int) -> memoryview:
+        start = y * self.stride
+        return memoryview(self.buffer)[start:start + self.width]
+
+    def rows(self) -> Iterator[memoryview]:
+        view = memoryview(self.buffer)
+        for start in range(0, self.height * self.stride, self.stride):
+            yield view[start:start + self.width]
+
+    def data(self) -> bytes:
+        # All rows without the line breaks, row after row
+        view = memoryview(self.buffer)
+        return b"".join(view[start:start + self.width] for start in range(0, self.height * self.stride, self.stride))
+
+    def array(self) -> "np.ndarray":
+        # 2-D uint8 view on the mapping, the line breaks are skipped by the row stride
+        if np is None:
+            raise RuntimeError("the NumPy view needs numpy to be installed")
+        return np.ndarray((self.height, self.width), np.uint8, self.buffer, 0, (self.stride, 1))
+
+    def find(self, value: bytes) -> int:
+        # Index (y * width + x) of the first cell holding value, or -1
+        i = self.buffer.find(value, 0, max(self.height * self.stride - 1, 0))
+        if i < 0:
+            return -1
+        y, x = divmod(i, self.stride)
+        return y * self.width + x
+
+    def find_all(self, pattern: re.Pattern) -> Iterator[tuple[int, int, int]]:
+        # (y, x, value) of every cell matching the single byte pattern, scanned row by row without decoding
+        for match in pattern.finditer(self.buffer, 0, max(self.height * self.stride - 1, 0)):
+            y, x = divmod(match.start(), self.stride)
+            yield y, x, self.buffer[match.start()]
+
+def _content_length(buffer) -> int:
+    # Length without the line breaks at the end
+    length = len(buffer)
+    while length > 0 and buffer[length - 1] in b"\r\n":
+        length -= 1
+    return length
+
+def expand_columns(data: bytes, tables: list[bytes]) -> bytearray:
+    # Replace every byte b of data by tables[0][b], tables[1][b], ... Each table is applied with bytes.translate and
+    # the results are interleaved with extended slices, so no byte is touched by Python code
+    factor = len(tables)
+    result = bytearray(len(data) * factor)
+    for i, table in enumerate(tables):
+        result[i::factor] = data.translate(table)
+    return result
@@ -0,0 +1,120 @@
+import atexit
+import cProfile
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Iterator
+
+# Opt-in instrumentation for the solvers. Everything is off by default, then phase() hands out a shared no-op
+# context manager and debug() returns right away, so the instrumented code paths cost next to nothing.
+# It can be switched on with enable() or through environment variables:
+#   AOC_INSTRUMENT=1       record the wall time and call count of every phase and print them at exit
+#   AOC_DEBUG=1            print the debug output of the solvers
+#   AOC_TRACEMALLOC=<file> trace allocations, report the peak and dump a tracemalloc snapshot at exit
+#   AOC_PROFILE=<file>     run the whole process under cProfile and dump the stats at exit
+
+enabled = False
+debug_enabled = False
+
+# Phase name -> [total seconds, number of calls]
+_phases: dict[str, list] = {}
+_noop = nullcontext()
+_profiler: cProfile.Profile | None = None
+
+class _Phase:
+    __slots__ = ("stats", "start")
+
+    def __init__(self, stats: list):
+        self.stats = stats
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.stats[0] += time.perf_counter() - self.start
+        self.stats[1] += 1
+        return False
+
+def phase(name: str):
+    if not enabled:
+        return _noop
+    stats = _phases.get(name)
+    if stats is None:
+        stats = _phases[name] = [0.0, 0]
+    return _Phase(stats)
+
+def debug(message: str | Callable[[], str]):
+    # Pass a callable for expensive messages, it only gets called when debug output is enabled
+    if not debug_enabled:
+        return
+    print(message() if callable(message) else message, file=sys.stderr)
+
+def enable(timing: bool = True, debug_output: bool = False, memory: bool = False):
+    global enabled, debug_enabled
+    enabled = enabled or timing
+    debug_enabled = debug_enabled or debug_output
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def reset():
+    _phases.clear()
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+def report() -> dict:
+    result = {name: {"seconds": seconds, "calls": calls} for name, (seconds, calls) in _phases.items()}
+    stats: dict = {"phases": result}
+    if tracemalloc.is_tracing():
+        stats["peak_memory"] = tracemalloc.get_traced_memory()[1]
+    return stats
+
+def print_report(file=sys.stderr):
+    stats = report()
+    for name, phase_stats in stats["phases"].items():
+        print(f"{name:<32} {phase_stats['seconds']:>10.4f}s {phase_stats['calls']:>10} calls", file=file)
+    if "peak_memory" in stats:
+        print(f"{'peak memory':<32} {stats['peak_memory'] / (1 << 20):>10.2f} MiB", file=file)
+
+@contextmanager
+def profile(path: str) -> Iterator[cProfile.Profile]:
+    # Profile only the code inside the with block and dump the stats (readable with pstats) to path
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+def snapshot(path: str):
+    # Dump the current allocations, readable with tracemalloc.Snapshot.load
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not tracing, enable memory tracking first")
+    tracemalloc.take_snapshot().dump(path)
+
+def _at_exit():
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(os.environ["AOC_PROFILE"])
+    if os.environ.get("AOC_TRACEMALLOC") and tracemalloc.is_tracing():
+        snapshot(os.environ["AOC_TRACEMALLOC"])
+    if enabled:
+        print_report()
+
+def _configure_from_env():
+    global _profiler
+    enable(
+        timing=os.environ.get("AOC_INSTRUMENT", "") not in ("", "0"),
+        debug_output=os.environ.get("AOC_DEBUG", "") not in ("", "0"),
+        memory=bool(os.environ.get("AOC_TRACEMALLOC")),
+    )
+    if os.environ.get("AOC_PROFILE"):
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    if enabled or _profiler is not None or tracemalloc.is_tracing():
+        atexit.register(_at_exit)
+
+_configure_from_env()
@@ -0,0 +1,150 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Iterator, NamedTuple, TextIO
+
+from aoc import cache
+from aoc.days import day_dir, find_days, load_day_module
+
+# Solves one part of a day for one input file. Solvers run in the worker processes, so they have to live in
+# this module and load the day modules themselves
+Solver = Callable[[str, int], int]
+
+def solve_day_one(path: str, part: int) -> int:
+    main = load_day_module(1)
+    list_a, list_b = main.load_columns(path)
+    return main.total_distance(list_a, list_b) if part == 1 else main.similarity_score(list_a, list_b)
+
+def solve_day_two(path: str, part: int) -> int:
+    main = load_day_module(2)
+    return main.count_reports(main.iter_reports(path), 0 if part == 1 else 1)[0]
+
+def solve_day_eight(path: str, part: int) -> int:
+    main = load_day_module(8)
+    return main.AntennaMap.load(path).antinode_count(inline=part == 2)
+
+def solve_day_fifteen(path: str, part: int) -> int:
+    main = load_day_module(15)
+    util = load_day_module(15, "util")
+    return main.simulate(main.parse_input(path, stream_directions=True), util.Mode.PART_ONE if part == 1 else util.Mode.PART_TWO)
+
+SOLVERS: dict[int, Solver] = {
+    1: solve_day_one,
+    2: solve_day_two,
+    8: solve_day_eight,
+    15: solve_day_fifteen,
+}
+
+# Rough cost of a job per byte of input, relative to each other. Only the order of the jobs depends on it
+COST_PER_BYTE = {
+    (1, 1): 1,
+    (1, 2): 1,
+    (2, 1): 1,
+    (2, 2): 1,
+    (8, 1): 2,
+    (8, 2): 4,
+    (15, 1): 20,
+    (15, 2): 40,
+}
+
+class Job(NamedTuple):
+    day: int
+    part: int
+    path: str
+
+    @property
+    def cost(self) -> int:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        return COST_PER_BYTE.get((self.day, self.part), 1) * size
+
+def run_job(job: Job) -> dict:
+    # Runs in a worker process. Failures are reported as part of the result, so one bad input doesn't stop the batch
+    start = time.perf_counter()
+    entry: dict = {"day": job.day, "part": job.part, "input": job.path}
+    try:
+        version = cache.source_version(day_dir(job.day) / "main.py")
+        entry["result"] = cache.cached(f"run-day{job.day:02d}", version, job.path,
+                                       lambda: SOLVERS[job.day](job.path, job.part), part=job.part)
+    except Exception as e:
+        entry["error"] = f"{type(e).__name__}: {e}"
+    entry["seconds"] = time.perf_counter() - start
+    return entry
+
+def schedule(jobs: list[Job]) -> list[Job]:
+    # Longest jobs first: the pool hands out jobs in submission order, so the big ones (like Day 15 Part 2)
+    # start right away and the small ones fill the gaps at the end, instead of one big job finishing last
+    return sorted(jobs, key=lambda job: job.cost, reverse=True)
+
+def run_jobs(jobs: list[Job], workers: int | None = None) -> Iterator[dict]:
+    # Results are yielded as soon as they are done, not in the order of the jobs
+    jobs = schedule(jobs)
+    if workers == 1:
+        yield from map(run_job, jobs)
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        for future in as_completed([executor.submit(run_job, job) for job in jobs]):
+            yield future.result()
+
+def parse_inputs(specs: list[str], days: list[int]) -> dict[int, list[str]]:
+    # DAY=PATH, where PATH can also be a glob pattern. Days without inputs use the input.txt in their directory
+    inputs: dict[int, list[str]] = {}
+    for spec in specs:
+        day, separator, pattern = spec.partition("=")
+        if not separator or not day.isdigit():
+            raise ValueError(f"input has to be given as DAY=PATH: {spec}")
+        paths = sorted(glob.glob(pattern)) or [pattern]
+        inputs.setdefault(int(day), []).extend(paths)
+    if not specs:
+        for day in days:
+            inputs[day] = [str(day_dir(day) / "input.txt")]
+    return inputs
+
+def create_jobs(inputs: dict[int, list[str]], parts: list[int]) -> list[Job]:
+    return [Job(day, part, path) for day, paths in inputs.items() for path in paths for part in parts]
+
+def write_results(results: Iterator[dict], output: TextIO) -> int:
+    errors = 0
+    for result in results:
+        errors += "error" in result
+        output.write(json.dumps(result))
+        output.write("\n")
+        output.flush()
+    return errors
+
+if __name__ == '__main__':
+    available_days = [day for day in find_days() if day in SOLVERS]
+
+    parser = argparse.ArgumentParser(description="Run the solvers of many days and inputs on a process pool")
+    parser.add_argument("inputs", nargs="*", help="DAY=PATH, PATH can be a glob pattern (default: input.txt of every day)")
+    parser.add_argument("-d", "--day", type=int, action="append", choices=available_days,
+                        help="only run the given day, can be repeated")
+    parser.add_argument("-p", "--part", type=int, choices=(1, 2), action="append",
+                        help="only run the given part, can be repeated (default: both)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("-o", "--output", default=None, help="file the JSON lines get written to (default: stdout)")
+    args = parser.parse_args()
+
+    try:
+        day_inputs = parse_inputs(args.inputs, args.day or available_days)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.day:
+        day_inputs = {day: paths for day, paths in day_inputs.items() if day in args.day}
+    unknown_days = sorted(set(day_inputs) - set(SOLVERS))
+    if unknown_days:
+        parser.error(f"no solver for day {', '.join(map(str, unknown_days))}")
+
+    all_jobs = create_jobs(day_inputs, sorted(set(args.part or (1, 2))))
+    if args.output is None:
+        failed = write_results(run_jobs(all_jobs, args.workers), sys.stdout)
+    else:
+        with open(args.output, "w") as f:
+            failed = write_results(run_jobs(all_jobs, args.workers), f)
+    sys.exit(1 if failed else 0)